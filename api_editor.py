@@ -0,0 +1,172 @@
+import base64
+import hashlib
+import os
+import stat
+from dataclasses import dataclass
+
+from command_runner import trace_context
+from github_client import GitHubError, get_client
+from org_inventory import fetch_file_texts, fetch_repos_inventory
+from repo_executor import DEFAULT_MAX_WORKERS, print_results, record_results, run_repos, select_targets
+
+
+@dataclass
+class FileEdit:
+    """
+    An edit of one file, applied in memory.
+
+    apply is called with the current text of the file (None if it doesn't exist or isn't text)
+    and returns the new content as str or bytes, or None to leave the file as it is.
+    mode is the git file mode; the API can only commit regular files (100644).
+    """
+    apply: callable
+    mode: str = '100644'
+
+
+# Creates a commit on a branch only if the branch is still at expectedHeadOid
+CREATE_COMMIT_MUTATION = """
+    mutation($input: CreateCommitOnBranchInput!) {
+      createCommitOnBranch(input: $input) { commit { oid } }
+    }"""
+
+
+def git_blob_sha(content):
+    """Return the object name git gives a blob with this content."""
+    return hashlib.sha1(b'blob %d\0' % len(content) + content).hexdigest()
+
+
+def overlay_edits(overlay):
+    """Return FileEdits writing the files of an overlay (see git_utils.read_overlay)."""
+    edits = {}
+    for path, file in overlay.items():
+        with open(file, 'rb') as overlay_file:
+            content = overlay_file.read()
+        mode = '100755' if os.stat(file).st_mode & stat.S_IXUSR else '100644'
+        edits[path] = FileEdit(lambda text, content=content: content, mode)
+    return edits
+
+
+class BranchEditor:
+    """
+    Commits in-memory file edits onto the branches of one repository through the GitHub API, without a clone.
+
+    The commit is created with the GraphQL createCommitOnBranch mutation and its expectedHeadOid, so the
+    branch only moves if it is still at the expected head: a compare-and-swap, also against a branch that
+    was reset in the meantime. The mutation can't set file modes, so edits of executable files are refused.
+    """
+
+    def __init__(self, org_name, repo_name, client=None):
+        self.org_name = org_name
+        self.repo_name = repo_name
+        self.client = client or get_client()
+
+    def path(self, path):
+        return f'repos/{self.org_name}/{self.repo_name}/{path}'
+
+    def removed_paths(self, tree, paths_to_remove):
+        """Return the files of the tree that are one of the paths or inside one of the folders."""
+        entries = self.client.get_json(self.path(f'git/trees/{tree}'), {'recursive': '1'})['tree']
+        prefixes = tuple(f"{path.strip('/')}/" for path in paths_to_remove)
+        return [entry['path'] for entry in entries if entry['type'] == 'blob'
+                and (entry['path'] in paths_to_remove or entry['path'].startswith(prefixes))]
+
+    def commit(self, branch, head, tree, current, edits, commit_message, paths_to_remove=None):
+        """
+        Apply the edits to the branch and move the branch to the new commit.
+
+        Args:
+            head (str): The commit the branch is expected at; the new commit is its child.
+            tree (str): The tree of that commit.
+            current (dict): Maps the edited paths to (blob, text) on the branch, or None if the file doesn't exist.
+            edits (dict): Maps the paths to their FileEdit.
+
+        Returns:
+            str: The new commit, or None if nothing changed.
+
+        Raises:
+            GitHubError: If the branch is no longer at head; it is never overwritten.
+        """
+        additions = []
+        for path, edit in edits.items():
+            blob, text = current.get(path) or (None, None)
+            content = edit.apply(text)
+            if content is None:
+                continue
+            content = content.encode('utf-8') if isinstance(content, str) else content
+            if git_blob_sha(content) == blob:
+                continue
+            if edit.mode != '100644':
+                raise RuntimeError(f"{path} has mode {edit.mode}, which can't be committed through the API; "
+                                   f"use the plumbing engine")
+            additions.append({'path': path, 'contents': base64.b64encode(content).decode('ascii')})
+
+        deletions = []
+        if paths_to_remove:
+            deletions = [{'path': path} for path in self.removed_paths(tree, paths_to_remove) if path not in edits]
+
+        if not additions and not deletions:
+            print(f"No changes to commit on branch {branch}.")
+            return None
+
+        headline, _, body = commit_message.partition('\n')
+        data = self.client.graphql(CREATE_COMMIT_MUTATION, {'input': {
+            'branch': {'repositoryNameWithOwner': f'{self.org_name}/{self.repo_name}', 'branchName': branch},
+            'expectedHeadOid': head,
+            'message': {'headline': headline, 'body': body.strip()},
+            'fileChanges': {'additions': additions, 'deletions': deletions},
+        }}, retry=False)
+        return data['createCommitOnBranch']['commit']['oid']
+
+
+def run_api_batch(org_name, repo_names, branches, edits, commit_message, paths_to_remove=None,
+                  max_workers=DEFAULT_MAX_WORKERS, index=None, operation=None):
+    """
+    Edit files on the branches of a list of repositories without cloning them and print a summary.
+
+    The heads, trees and current contents of the edited files of all repositories are read with a few
+    GraphQL requests. Each changed branch then costs one createCommitOnBranch mutation (plus a tree listing
+    if folders are removed). The mutation checks the head read before, so a branch that moved in the
+    meantime, also one reset to an older commit, is never overwritten; its repository is reported as failed.
+
+    Args:
+        edits (dict): Maps the paths in the repositories to their FileEdit.
+        commit_message (callable): Called as commit_message(branch); returns the commit message.
+        paths_to_remove (list): Files or folders to remove from the branches.
+        index (RepoIndex): With an operation key, only the branches that changed since the last run are edited.
+    """
+    repo_names, targets = select_targets(org_name, repo_names, branches, True, index, operation)
+    if not repo_names:
+        print(f"Processed 0 of 0 repositories successfully in {org_name}")
+        return []
+
+    inventory = fetch_repos_inventory(org_name, repo_names, branches)
+    current = {}
+    for path in edits:
+        for (repo_name, branch), file in fetch_file_texts(org_name, repo_names, branches, path).items():
+            current.setdefault((repo_name, branch), {})[path] = file
+
+    def process_repo(repo_name, workdir):
+        repo = inventory[repo_name]
+        if repo is None:
+            raise RuntimeError(f"Repository {org_name}/{repo_name} does not exist.")
+        editor = BranchEditor(org_name, repo_name)
+        heads = {}
+        for branch in targets[repo_name]:
+            if not repo.heads.get(branch):
+                print(f"Branch {branch} does not exist in {org_name}/{repo_name}. Skipped.")
+                continue
+            with trace_context(branch=branch):
+                try:
+                    commit = editor.commit(branch, repo.heads[branch], repo.trees[branch],
+                                           current.get((repo_name, branch), {}), edits, commit_message(branch),
+                                           paths_to_remove)
+                except GitHubError as e:
+                    raise RuntimeError(f"Updating {branch} of {org_name}/{repo_name} failed, "
+                                       f"the branch may have moved: {e}") from e
+            heads[branch] = commit or repo.heads[branch]
+        return heads
+
+    results = run_repos(repo_names, process_repo, max_workers, workdir=False)
+    record_results(org_name, results, index, operation)
+    print_results(org_name, results)
+    return results
@@ -1,43 +1,31 @@
 import os
-import shutil
 from pathlib import Path
 from dotenv import load_dotenv
-from batch_file_manager import manage_files_in_repo
-from git_utils import clone_repo, checkout_branch, commit_and_push_changes
+from command_runner import print_trace_summary
+from batch_file_manager import OverlayStep
+from git_utils import SPARSE_CLONE
+from mirror_cache import MirrorCache
+from repo_executor import DEFAULT_MAX_WORKERS
+from repo_index import RepoIndex
+from repo_pipeline import run_pipeline
 
-from batch_requirements_manager import manage_requirements_file
+from batch_requirements_manager import RequirementsStep
 
 
-def process_repos(org_name, repo_names, github_token, template_dir, branches):
+def process_repos(org_name, repo_names, github_token, template_dir, branches, max_workers=DEFAULT_MAX_WORKERS,
+                  cache=None, profile=SPARSE_CLONE, index=None, plan_only=False):
     """Process the list of repositories, manage files, and update their requirements.txt across multiple branches."""
+    steps = [
+        # Manage files (copy _run_pylint.py from the template_dir)
+        OverlayStep(template_dir),
+        # Add pylint to requirements.txt
+        RequirementsStep(packages_to_add={"pylint": "3.2.7"}),
+    ]
 
-    for repo_name in repo_names:
-        # Clone the repository
-        clone_repo(org_name, repo_name, github_token)
-
-        # Change directory to the cloned repository
-        os.chdir(repo_name)
-
-        for branch in branches:
-            # Checkout the branch
-            checkout_branch(branch)
-
-            # Manage files (copy _run_pylint.py from the template_dir)
-            manage_files_in_repo(Path(os.getcwd()), template_dir)
-
-            # Add pylint to requirements.txt
-            manage_requirements_file(Path(os.getcwd()), packages_to_add={"pylint": "3.2.7"})
-
-            # Commit and push changes to the current branch
-            commit_and_push_changes(branch,f"Added _run_pylint and requirements and pushed updates to {branch} branch")
-
-        # Return to the parent directory
-        os.chdir('..')
-
-        # Optionally, remove the cloned repository folder after processing
-        shutil.rmtree(repo_name)
-
-    print(f"Repositories processed successfully in {org_name}")
+    # Commit and push changes to each branch
+    return run_pipeline(org_name, repo_names, branches, github_token, steps,
+                        lambda branch: f"Added _run_pylint and requirements and pushed updates to {branch} branch",
+                        max_workers, cache, profile, index, plan_only)
 
 
 def main():
@@ -106,6 +94,15 @@ def main():
     # Branches to update
     branches = ['main', 'solution']
 
+    # Number of repositories processed at the same time
+    max_workers = 8
+
+    # Only process the branches that changed since the last successful run
+    incremental = True
+
+    # Only print which repositories would be processed and what it would cost
+    plan_only = False
+
     # Load GitHub token from the environment
     load_dotenv()
     github_token = os.getenv('GITHUB_TOKEN')
@@ -120,8 +117,13 @@ def main():
         repo_names,
         github_token,
         template_dir,
-        branches
+        branches,
+        max_workers,
+        MirrorCache(),
+        index=RepoIndex() if incremental else None,
+        plan_only=plan_only
     )
+    print_trace_summary()
 
 
 if __name__ == '__main__':
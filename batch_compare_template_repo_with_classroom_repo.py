@@ -1,14 +1,64 @@
+import itertools
 import os
-import subprocess
 import shutil
-from git_utils import clone_repo, checkout_branch, commit_and_push_changes
+import tempfile
+from command_runner import print_trace_summary, run_command
+from drift_report import build_drift_report, report_pairs, summarize, write_html_report, write_json_report
+from git_utils import (SHALLOW_CLONE, SPARSE_CLONE, checkout_branch, clone_repo, commit_and_push_changes, ls_tree,
+                       resolve_branch)
+from github_client import GitHubError
+from list_all_repos_in_org_with_filter import iter_repos
+from mirror_cache import MirrorCache
+from org_inventory import fetch_repos_inventory
+from repo_executor import DEFAULT_MAX_WORKERS, print_results, process_repo_manifests, run_repos
+from tree_sync import sync_tree
 from dotenv import load_dotenv
 
 
+def target_repo_name(target_org, repo_name):
+    """Return the name of the classroom repository created from the template repository."""
+    return f'{target_org}-{repo_name}-{repo_name}'
+
+
+def drifted_branches(source_org, target_org, repo_names, branches):
+    """
+    Compare the trees of the branches of each template/classroom pair without cloning.
+
+    Identical trees mean identical files, so only the pairs and branches whose tree objects
+    differ have to be cloned and compared. All trees are looked up with a few GraphQL requests.
+
+    Returns:
+    dict: Maps the template repository names to the branches that differ,
+          or None if the trees can't be looked up.
+    """
+    try:
+        sources = fetch_repos_inventory(source_org, repo_names, branches)
+        targets = fetch_repos_inventory(target_org, [target_repo_name(target_org, name) for name in repo_names],
+                                        branches)
+    except GitHubError as e:
+        print(f"Trees could not be compared through the API, comparing all repositories: {e}")
+        return None
+
+    drifted = {}
+    for repo_name in repo_names:
+        source, target = sources[repo_name], targets[target_repo_name(target_org, repo_name)]
+        if source is None or target is None:
+            print(f"Error: {source_org}/{repo_name} or its classroom repository does not exist.")
+            continue
+        for branch in branches:
+            if not (source.trees.get(branch) and target.trees.get(branch)):
+                print(f"Branch '{branch}' does not exist in {repo_name} or its classroom repository.")
+            elif source.trees[branch] == target.trees[branch]:
+                print(f"'{repo_name}' is identical to its classroom repository on branch '{branch}'.")
+            else:
+                drifted.setdefault(repo_name, []).append(branch)
+    return drifted
+
+
 def are_repos_identical(repo_path1, repo_path2):
     """Compare two git repositories and list the files that have changed if they are not identical."""
-    result = subprocess.run(["git", "diff", "--name-only", "--no-index", repo_path1, repo_path2],
-                            capture_output=True, text=True)
+    result = run_command(["git", "diff", "--name-only", "--no-index", repo_path1, repo_path2],
+                         capture_output=True, text=True)
     if result.returncode == 0:
         return True
     else:
@@ -21,7 +71,7 @@ def remove_existing_repo(repo_dir):
     """Remove the existing directory if it exists and is not empty."""
     if os.path.exists(repo_dir):
         print(f"Removing existing directory: {repo_dir}")
-        subprocess.run(['rm', '-rf', repo_dir])
+        run_command(['rm', '-rf', repo_dir])
 
 
 def repo_cloned_successfully(repo_dir):
@@ -29,21 +79,19 @@ def repo_cloned_successfully(repo_dir):
     return os.path.exists(repo_dir) and os.listdir(repo_dir)
 
 
-def copy_files(source_dir, target_dir):
-    """Copy all files from source to target, excluding .git folder."""
-    for item in os.listdir(source_dir):
-        src_path = os.path.join(source_dir, item)
-        tgt_path = os.path.join(target_dir, item)
-        if os.path.isdir(src_path) and item == '.git':
-            continue  # Skip the .git directory
-        elif os.path.isdir(src_path):
-            shutil.copytree(src_path, tgt_path, dirs_exist_ok=True)
-        else:
-            shutil.copy2(src_path, tgt_path)
-
+def compare_repos(source_org, target_org, repo_names, github_token, branches, fast_path=True, delete=False):
+    """
+    Compare repositories from two organizations and update target repo if differences exist.
+    With fast_path only the pairs and branches whose trees differ (see drifted_branches) are cloned.
+    Only the files that differ are written; with delete the files missing in the source are removed from the target.
+    """
+    drifted = drifted_branches(source_org, target_org, repo_names, branches) if fast_path else None
+    if drifted is not None:
+        print(f"{len(drifted)} of {len(repo_names)} repositories differ from their template")
+        repo_names = [repo_name for repo_name in repo_names if repo_name in drifted]
+        if not repo_names:
+            return
 
-def compare_repos(source_org, target_org, repo_names, github_token, branches):
-    """Compare repositories from two organizations and update target repo if differences exist."""
     temp_dir = './TEMP_REPOS'
 
     # Create a temporary directory for repos if it doesn't exist
@@ -55,7 +103,7 @@ def compare_repos(source_org, target_org, repo_names, github_token, branches):
 
     for repo_name in repo_names:
         source_repo = repo_name
-        target_repo = f'{target_org}-{repo_name}-{repo_name}'
+        target_repo = target_repo_name(target_org, repo_name)
 
         # Define repo directories inside TEMP_REPOS
         source_repo_dir = source_repo
@@ -83,7 +131,7 @@ def compare_repos(source_org, target_org, repo_names, github_token, branches):
             continue
 
         # For each branch, check if the branches are identical
-        for branch in branches:
+        for branch in (drifted[repo_name] if drifted is not None else branches):
             print(f"Checking branch '{branch}' for {source_repo} and {target_repo}")
 
             # Checkout the branch in both repos
@@ -105,9 +153,13 @@ def compare_repos(source_org, target_org, repo_names, github_token, branches):
             else:
                 print(f"The repositories '{source_repo}' and '{target_repo}' differ on branch '{branch}'.")
 
-                # Copy the files from source to target
+                # Copy the files that differ from source to target
                 print(f"Updating {target_repo} with files from {source_repo}...")
-                copy_files(source_repo_dir, target_repo_dir)
+                changes = sync_tree(source_repo_dir, target_repo_dir, delete=delete)
+                if not changes:
+                    print(f"No files to update in {target_repo} on branch '{branch}'.")
+                    continue
+                print(f"Changes in {target_repo}: {changes}")
 
                 # Commit and push the changes using git_utils
                 commit_message = f"Update from {source_repo} on branch {branch}"
@@ -120,6 +172,96 @@ def compare_repos(source_org, target_org, repo_names, github_token, branches):
         remove_existing_repo(target_repo_dir)
 
 
+def fan_out_template(source_org, target_org, repo_name, github_token, branches, target_pattern='{repo_name}-*',
+                     max_workers=DEFAULT_MAX_WORKERS, cache=None):
+    """
+    Sync one template repository to all matching classroom repositories.
+
+    The template is cloned once (through the cache, if given) and the files of each branch (its manifest)
+    are listed once. The classroom repositories are then processed in parallel, each with a bare, blobless
+    clone that bypasses the cache, as they are only cloned once and would evict the template mirrors;
+    only the repositories where a template file is missing or different are committed and pushed.
+    The classroom repositories are processed as they are listed, the first ones are synced while the
+    remaining pages of the organization are still being fetched.
+
+    Parameters:
+    target_pattern (str): Glob pattern of the classroom repositories, '{repo_name}' is replaced by the template name.
+    """
+    target_names = iter_repos(target_org, pattern=target_pattern.format(repo_name=repo_name))
+    # Only the first name is waited for, so the template isn't cloned for nothing
+    first_target = next(target_names, None)
+    if first_target is None:
+        print(f"No classroom repositories found for {repo_name} in {target_org}")
+        return []
+    target_names = itertools.chain([first_target], target_names)
+
+    template_dir = tempfile.mkdtemp(prefix=f'{repo_name}-template-')
+    try:
+        # Clone the template and list the files of each branch only once
+        template_path = clone_repo(source_org, repo_name, github_token, cwd=template_dir, cache=cache,
+                                   profile=SHALLOW_CLONE, branches=branches, bare=True)
+        manifests = {}
+        for branch in branches:
+            commit = resolve_branch(template_path, branch)
+            if commit is None:
+                print(f"Branch '{branch}' does not exist in {source_org}/{repo_name}.")
+                continue
+            manifests[branch] = ls_tree(template_path, commit)
+
+        def process_repo(target_name, workdir):
+            return process_repo_manifests(target_org, target_name, github_token, workdir, template_path, manifests,
+                                          lambda branch: f"Update from {repo_name} on branch {branch}",
+                                          None, SPARSE_CLONE)
+
+        results = run_repos(target_names, process_repo, max_workers)
+    finally:
+        shutil.rmtree(template_dir, ignore_errors=True)
+
+    print_results(target_org, results)
+    return results
+
+
+def fan_out(source_org, target_org, repo_names, github_token, branches, target_pattern='{repo_name}-*',
+            max_workers=DEFAULT_MAX_WORKERS, cache=None):
+    """Sync each template repository to all of its classroom repositories (see fan_out_template)."""
+    results = []
+    for repo_name in repo_names:
+        results += fan_out_template(source_org, target_org, repo_name, github_token, branches, target_pattern,
+                                    max_workers, cache)
+    if cache is not None:
+        cache.evict()
+    return results
+
+
+def report_drift(source_org, target_org, repo_names, branches, report_path='drift_report', target_pattern=None,
+                 max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Write a JSON report and an HTML summary of the files that drifted between the templates
+    and their classroom repositories, on all branches. Nothing is cloned or pushed.
+
+    Parameters:
+    report_path (str): The report is written to report_path.json and report_path.html.
+    target_pattern (str): Compare each template with all classroom repositories matching the pattern,
+                          instead of the single repository named by target_repo_name.
+
+    Returns:
+    dict: The report, or None if the repositories can't be looked up.
+    """
+    try:
+        pairs = report_pairs(target_org, repo_names, target_repo_name, target_pattern)
+        report = build_drift_report(source_org, target_org, pairs, branches, max_workers)
+    except GitHubError as e:
+        print(f"Repository inventory unavailable, no report written: {e}")
+        return None
+    write_json_report(report, f'{report_path}.json')
+    write_html_report(report, f'{report_path}.html')
+
+    counts = ', '.join(f'{count} {status}' for status, count in sorted(summarize(report).items()))
+    print(f"Compared {len(pairs)} repositories on {len(branches)} branches: {counts}")
+    print(f"Report written to {report_path}.json and {report_path}.html")
+    return report
+
+
 def main():
     # Usage Example
     source_org_name = 'templates-python'
@@ -203,7 +345,27 @@ def main():
 
     branches = ['main', 'solution']
 
-    compare_repos(source_org_name, target_org_name, repo_names, github_token, branches)
+    # 'pairs' compares each template with one classroom repository,
+    # 'fan-out' syncs each template to all classroom repositories matching target_pattern,
+    # 'report' only writes drift_report.json and drift_report.html without pushing anything
+    mode = 'pairs'
+    target_pattern = '{repo_name}-*'
+
+    # Set to target_pattern to report on all classroom repositories of each template instead of one
+    report_pattern = None
+
+    # Number of classroom repositories synced at the same time in fan-out mode
+    max_workers = 8
+
+    if mode == 'report':
+        report_drift(source_org_name, target_org_name, repo_names, branches, target_pattern=report_pattern,
+                     max_workers=max_workers)
+    elif mode == 'fan-out':
+        fan_out(source_org_name, target_org_name, repo_names, github_token, branches, target_pattern, max_workers,
+                MirrorCache())
+    else:
+        compare_repos(source_org_name, target_org_name, repo_names, github_token, branches)
+    print_trace_summary()
 
 
 if __name__ == '__main__':
@@ -1,9 +1,28 @@
 import os
 import json
 import shutil
+from dataclasses import dataclass
+from pathlib import Path
 from dotenv import load_dotenv
 
-from git_utils import clone_repo, checkout_branch, commit_and_push_changes
+from command_runner import print_trace_summary
+from git_utils import SPARSE_CLONE
+from github_client import GitHubError
+from mirror_cache import MirrorCache
+from org_inventory import fetch_object_ids
+from repo_executor import DEFAULT_MAX_WORKERS
+from repo_index import RepoIndex
+from repo_pipeline import run_pipeline
+
+# The converter only reads and writes the .github folder and lists the Python files in the root folder
+SPARSE_PATHS = ['/.github/', '/*.py']
+
+# The files that tell the old (2023) and the new (2024) layout apart
+OLD_LAYOUT_FILE = '.github/classroom/autograding.json'
+NEW_LAYOUT_FILE = '.github/autograding/unittests.json'
+
+# Layouts that still need the conversion; mixed is an old layout with parts of the new one
+UNCONVERTED_LAYOUTS = ('old', 'mixed')
 
 
 def read_json(file_path):
@@ -35,75 +54,212 @@ def list_root_python_files(folder_path):
     return python_files
 
 
-def process_repository(org_name, repo_name, github_token, template_dir):
-    """Process a single repository by cloning, making changes, and pushing updates."""
-    # Clone the repository
-    clone_repo(org_name, repo_name, github_token)
-
-    # Change directory to the cloned repository
-    os.chdir(repo_name)
-
+def write_lint_json(project_folder, max_errors=5):
+    """Create .github/autograding/lint.json listing the Python files in the root folder. Returns False if it was up to date."""
+    lint_json_path = os.path.join(project_folder, '.github', 'autograding', 'lint.json')
+    lint_content = {'files': list_root_python_files(project_folder), 'ignore': [], 'max': max_errors}
+    if os.path.exists(lint_json_path) and read_json(lint_json_path) == lint_content:
+        return False
+    os.makedirs(os.path.dirname(lint_json_path), exist_ok=True)
+    write_json(lint_json_path, lint_content)
+    return True
+
+
+def classify_layout(has_old_file, has_new_file):
+    """Return the layout of a project: 'old', 'new', 'mixed' (both files) or 'unknown' (neither)."""
+    if has_old_file and has_new_file:
+        return 'mixed'
+    if has_old_file:
+        return 'old'
+    if has_new_file:
+        return 'new'
+    return 'unknown'
+
+
+def project_layout(project_folder):
+    """Return the layout of a project folder (see classify_layout)."""
+    return classify_layout(os.path.isfile(os.path.join(project_folder, OLD_LAYOUT_FILE)),
+                           os.path.isfile(os.path.join(project_folder, NEW_LAYOUT_FILE)))
+
+
+def probe_layouts(org_name, repo_names, branches):
+    """
+    Return the layout of each branch of the listed repositories without cloning them.
+    The layout files are looked up with a few GraphQL requests, 100 repositories per request.
+
+    Returns:
+    dict: Maps each repository to a dict mapping its branches to their layout, or to 'missing'
+    if the repository or branch doesn't exist.
+    """
+    object_ids = fetch_object_ids(org_name, list(repo_names), branches, ['', OLD_LAYOUT_FILE, NEW_LAYOUT_FILE])
+    layouts = {}
+    for repo_name in repo_names:
+        layouts[repo_name] = {}
+        for branch in branches:
+            objects = object_ids[(repo_name, branch)]
+            layouts[repo_name][branch] = (classify_layout(objects[OLD_LAYOUT_FILE], objects[NEW_LAYOUT_FILE])
+                                          if objects[''] else 'missing')
+    return layouts
+
+
+def select_unconverted(org_name, repo_names, branches):
+    """
+    Decide which branches still need the conversion and print how many branches have which layout.
+
+    Returns:
+    dict: Maps the repositories to their old or mixed branches, or None if the layouts can't be probed.
+    """
+    try:
+        layouts = probe_layouts(org_name, repo_names, branches)
+    except GitHubError as e:
+        print(f"Layouts could not be probed: {e}")
+        return None
+
+    counts = {}
+    for repo_name, branch_layouts in layouts.items():
+        for branch, layout in branch_layouts.items():
+            counts[layout] = counts.get(layout, 0) + 1
+            if layout == 'unknown':
+                print(f"Branch {branch} of {org_name}/{repo_name} has no autograding configuration. Skipped.")
+    print(f"Layouts in {org_name}: {', '.join(f'{count} {layout}' for layout, count in sorted(counts.items()))}")
+    return {repo_name: [branch for branch in branches if branch_layouts[branch] in UNCONVERTED_LAYOUTS]
+            for repo_name, branch_layouts in layouts.items()}
+
+
+def convert_project(project_folder, template_dir, lint=True, max_errors=5):
+    """
+    Convert a project folder from the old pygrader format (2023) to the new format (2024).
+    With lint a lint.json allowing max_errors pylint errors is generated as part of the conversion.
+    Returns False without changing anything if there is no .github/classroom/autograding.json,
+    e.g. because the project was already converted.
+    """
+    # Paths
+    github_folder = os.path.join(project_folder, '.github')
+    classroom_folder = os.path.join(github_folder, 'classroom')
+    autograding_folder = os.path.join(github_folder, 'autograding')
+
+    autograding_json_path = os.path.join(classroom_folder, 'autograding.json')
+    unittests_json_path = os.path.join(autograding_folder, 'unittests.json')
+    pylintrc_path = os.path.join(template_dir, 'pylintrc')
+    dest_pylintrc_path = os.path.join(autograding_folder, 'pylintrc')
+
+    workflows_folder = os.path.join(github_folder, 'workflows')
+    classroom_yml_path = os.path.join(template_dir, 'classroom.yml')
+    dest_classroom_yml_path = os.path.join(workflows_folder, 'classroom.yml')
+    copyissues_yml_path = os.path.join(template_dir, 'copyissues.yml')
+    dest_copyissues_yml_path = os.path.join(workflows_folder, 'copyissues.yml')
+
+    # Nothing to convert, e.g. the project was already converted
+    if not os.path.isfile(autograding_json_path):
+        print(f"No {OLD_LAYOUT_FILE} in {project_folder}, layout is {project_layout(project_folder)}. Skipped.")
+        return False
+
+    # Convert autograding.json before anything is written, a malformed file leaves the project as it is
+    autograding_content = read_json(autograding_json_path)
+    unittests_content = convert_autograding(autograding_content)
+
+    # Create necessary folders
+    os.makedirs(autograding_folder, exist_ok=True)
+    os.makedirs(workflows_folder, exist_ok=True)
+
+    # Write unittests.json
+    write_json(unittests_json_path, unittests_content)
+
+    # Create lint.json
+    if lint:
+        write_lint_json(project_folder, max_errors)
+
+    # Copy pylintrc
+    if os.path.exists(pylintrc_path):
+        shutil.copy(pylintrc_path, dest_pylintrc_path)
+
+    # Copy classroom.yml and copyissues.yml
+    if os.path.exists(classroom_yml_path):
+        shutil.copy(classroom_yml_path, dest_classroom_yml_path)
+    if os.path.exists(copyissues_yml_path):
+        shutil.copy(copyissues_yml_path, dest_copyissues_yml_path)
+
+    # Remove classroom folder
+    if os.path.exists(classroom_folder):
+        shutil.rmtree(classroom_folder)
+    return True
+
+
+@dataclass
+class AutogradingStep:
+    """
+    Pipeline step converting .github/classroom/autograding.json to the new .github/autograding layout.
+    Branches that are already converted are left as they are. With lint the lint.json is generated as
+    part of the conversion, without it it is left to a LintStep.
+    """
+    template_dir: str
+    max_errors: int = 5
+    lint: bool = True
+    name = 'autograding'
+    description = 'Converted autograding to the new format'
+
+    def sparse_paths(self):
+        return SPARSE_PATHS
+
+    def parameters(self):
+        return [Path(self.template_dir), self.max_errors, self.lint]
+
+    def apply(self, repo_path, branch):
+        return convert_project(repo_path, self.template_dir, self.lint, self.max_errors)
+
+
+@dataclass
+class LintStep:
+    """Pipeline step generating .github/autograding/lint.json from the Python files in the root folder."""
+    max_errors: int = 5
+    name = 'lint'
+    description = 'Generated lint.json'
+
+    def sparse_paths(self):
+        return ['/.github/autograding/', '/*.py']
+
+    def parameters(self):
+        return [self.max_errors]
+
+    def apply(self, repo_path, branch):
+        return write_lint_json(repo_path, self.max_errors)
+
+
+def process_repositories(org_name, repo_names, github_token, template_dir, max_workers=DEFAULT_MAX_WORKERS,
+                         cache=None, profile=SPARSE_CLONE, index=None, plan_only=False, probe=True):
+    """
+    Process the repositories in parallel by cloning, making changes, and pushing updates.
+    With probe only the branches that still have the old or a mixed layout are cloned and converted,
+    so running it again over a partly converted organization costs a few API requests.
+    The lint.json is only generated for converted branches: by a LintStep after the conversion of the
+    probed branches, or as part of the conversion without probe.
+    """
     # Branches to update
     branches = ['main', 'solution']
 
-    for branch in branches:
-        # Checkout the branch
-        checkout_branch(branch)
-
-        # Paths
-        project_folder = os.getcwd()
-        github_folder = os.path.join(project_folder, '.github')
-        classroom_folder = os.path.join(github_folder, 'classroom')
-        autograding_folder = os.path.join(github_folder, 'autograding')
-
-        autograding_json_path = os.path.join(classroom_folder, 'autograding.json')
-        unittests_json_path = os.path.join(autograding_folder, 'unittests.json')
-        lint_json_path = os.path.join(autograding_folder, 'lint.json')
-        pylintrc_path = os.path.join(template_dir, 'pylintrc')
-        dest_pylintrc_path = os.path.join(autograding_folder, 'pylintrc')
-
-        workflows_folder = os.path.join(github_folder, 'workflows')
-        classroom_yml_path = os.path.join(template_dir, 'classroom.yml')
-        dest_classroom_yml_path = os.path.join(workflows_folder, 'classroom.yml')
-        copyissues_yml_path = os.path.join(template_dir, 'copyissues.yml')
-        dest_copyissues_yml_path = os.path.join(workflows_folder, 'copyissues.yml')
-
-        # Create necessary folders
-        os.makedirs(autograding_folder, exist_ok=True)
-        os.makedirs(workflows_folder, exist_ok=True)
+    # Without probe the layouts are unknown, lint.json is then only written by a conversion
+    steps = [AutogradingStep(template_dir)]
 
-        # Convert autograding.json to unittests.json
-        autograding_content = read_json(autograding_json_path)
-        unittests_content = convert_autograding(autograding_content)
-        write_json(unittests_json_path, unittests_content)
+    # Probe the layouts without cloning and keep the branches that still need the conversion
+    if probe:
+        targets = select_unconverted(org_name, repo_names, branches)
+        if targets is None:
+            print("Aborted, set probe = False to process all branches anyway.")
+            return []
+        if not any(targets.values()):
+            print(f"All branches in {org_name} are already converted.")
+            return []
+        branches = targets
+        steps = [AutogradingStep(template_dir, lint=False), LintStep()]
 
-        # Create lint.json
-        python_files = list_root_python_files(project_folder)
-        lint_content = {'files': python_files, 'ignore': [], 'max': 5}
-        write_json(lint_json_path, lint_content)
+    return run_pipeline(org_name, repo_names, branches, github_token, steps,
+                        lambda branch: f"Update files for {branch} branch", max_workers, cache, profile, index,
+                        plan_only)
 
-        # Copy pylintrc
-        if os.path.exists(pylintrc_path):
-            shutil.copy(pylintrc_path, dest_pylintrc_path)
 
-        # Copy classroom.yml and copyissues.yml
-        if os.path.exists(classroom_yml_path):
-            shutil.copy(classroom_yml_path, dest_classroom_yml_path)
-        if os.path.exists(copyissues_yml_path):
-            shutil.copy(copyissues_yml_path, dest_copyissues_yml_path)
-
-        # Remove classroom folder
-        if os.path.exists(classroom_folder):
-            shutil.rmtree(classroom_folder)
-
-        # Commit and push the changes to the current branch
-        commit_and_push_changes(branch, f"Update files for {branch} branch" )
-
-    # Go back to the parent directory before processing the next repository
-    os.chdir('..')
-
-    # Optionally, remove the cloned repository folder after processing
-    shutil.rmtree(repo_name)
+def process_repository(org_name, repo_name, github_token, template_dir):
+    """Process a single repository by cloning, making changes, and pushing updates."""
+    return process_repositories(org_name, [repo_name], github_token, template_dir, max_workers=1)
 
 
 def main():
@@ -124,14 +280,25 @@ def main():
         #"m319-lb02a-efuel",
     ]
 
+    # Number of repositories processed at the same time
+    max_workers = 8
+
+    # Only process the branches that changed since the last successful run
+    incremental = True
+
+    # Only print which repositories would be processed and what it would cost
+    plan_only = False
+
+    # Only clone the branches that still have the old layout
+    probe = True
+
     # GitHub access token
     github_token = os.environ['GITHUB_TOKEN']
 
-    # Process each repository
-    for repo_name in repo_names:
-        process_repository(org_name, repo_name, github_token, template_dir)
-
-    print('Operation completed successfully for all repositories.')
+    # Process the repositories
+    process_repositories(org_name, repo_names, github_token, template_dir, max_workers, MirrorCache(),
+                         index=RepoIndex() if incremental else None, plan_only=plan_only, probe=probe)
+    print_trace_summary()
 
 
 if __name__ == '__main__':
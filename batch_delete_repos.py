@@ -1,5 +1,7 @@
 import subprocess
 
+from command_runner import print_trace_summary, run_command, trace_context
+
 def delete_repos(repo_list, current_owner):
     """
     Deletes a list of repositories for a specific owner using the GitHub CLI.
@@ -12,10 +14,11 @@ def delete_repos(repo_list, current_owner):
     None
     """
     for repo in repo_list:
-        command = f'gh repo delete {current_owner}/{repo} --yes'
+        command = ['gh', 'repo', 'delete', f'{current_owner}/{repo}', '--yes']
         try:
             print(f'Deleting repo {repo} owned by {current_owner}')
-            subprocess.run(command, shell=True, check=True)
+            with trace_context(repo=repo):
+                run_command(command, check=True)
             print(f'Successfully deleted {repo}')
         except subprocess.CalledProcessError as e:
             print(f'Failed to delete {repo}: {e}')
@@ -32,4 +35,5 @@ if __name__ == '__main__':
     current_owner = "m319-ix24"
 
     # Delete the repositories
-    delete_repos(repos_to_delete, current_owner)
\ No newline at end of file
+    delete_repos(repos_to_delete, current_owner)
+    print_trace_summary()
\ No newline at end of file
@@ -1,22 +1,47 @@
 import os
 import shutil
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 
-from git_utils import clone_repo, checkout_branch, commit_and_push_changes
+from api_editor import overlay_edits, run_api_batch
+from command_runner import print_trace_summary
+from git_utils import SPARSE_CLONE, read_overlay
+from mirror_cache import MirrorCache
+from repo_executor import DEFAULT_MAX_WORKERS, run_overlay_batch
+from repo_index import RepoIndex
+from repo_pipeline import pipeline_operation, run_pipeline
+from tree_sync import file_hash, list_files
+
+
+@lru_cache(maxsize=None)
+def template_manifest(template_dir):
+    """
+    Hash the files of the template directory once per run.
+    Returns a dict mapping each relative path to (file, size, SHA-256), shared by all repositories and branches.
+    """
+    return {relative_path: (path, path.stat().st_size, file_hash(path))
+            for relative_path, path in sorted(list_files(template_dir).items())}
+
 
 def manage_files_in_repo(repo_path, template_dir, files_to_remove=None):
     """
     Manage files (copy and replace) from the template directory to the repository, maintaining the folder structure.
     Optionally remove files and folders specified in files_to_remove.
+    Files that are already identical to the template (same size and hash) are not written.
 
     Args:
         repo_path (Path): The path to the repository.
         template_dir (Path): The path to the template directory containing files and folders to add or update.
         files_to_remove (list): List of file/folder paths to remove from the repository.
+
+    Returns:
+        list: The relative paths that were removed or written, or None if the template directory doesn't exist.
     """
     repo_path = Path(repo_path)
     template_dir = Path(template_dir)
+    changes = []
 
     # Remove specified files and folders
     if files_to_remove:
@@ -29,58 +54,84 @@ def manage_files_in_repo(repo_path, template_dir, files_to_remove=None):
                 else:
                     file_path.unlink()
                     print(f"Removed file {file_name} from {repo_path}")
+                changes.append(file_name)
             else:
                 print(f"Warning: {file_name} not found in {repo_path}")
 
     # Ensure the template directory exists
     if not template_dir.exists():
         print(f"Error: Template directory {template_dir} does not exist.")
-        return False  # Exit early if the template directory doesn't exist
+        return None  # Exit early if the template directory doesn't exist
 
-    # Copy all files and folders from the template directory to the repository
-    for item in template_dir.rglob('*'):
-        relative_path = item.relative_to(template_dir)
+    # Copy the files of the template that differ from the repository
+    for relative_path, (item, size, digest) in template_manifest(template_dir.resolve()).items():
         destination_path = repo_path / relative_path
+        if (destination_path.is_file() and destination_path.stat().st_size == size
+                and file_hash(destination_path) == digest):
+            continue
+
+        # Copy file and replace if it already exists
+        destination_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(item, destination_path)
+        print(f"Copied {item} to {destination_path}")
+        changes.append(relative_path)
+    return changes
 
-        if item.is_dir():
-            # Create directory if it doesn't exist
-            destination_path.mkdir(parents=True, exist_ok=True)
-        else:
-            # Copy file and replace if it already exists
-            shutil.copy2(item, destination_path)
-            print(f"Copied {item} to {destination_path}")
-    return True
 
+def template_sparse_paths(template_dir, files_to_remove=None):
+    """Return the sparse checkout patterns covering the template files and the files to remove."""
+    template_dir = Path(template_dir)
+    paths = [f"/{item.relative_to(template_dir).as_posix()}" for item in template_dir.rglob('*') if item.is_file()]
+    return paths + [f"/{file_name}" for file_name in files_to_remove or []]
 
 
+@dataclass
+class OverlayStep:
+    """Pipeline step copying the files of a template directory into the repository and removing files."""
+    template_dir: Path
+    files_to_remove: list = None
+    name = 'overlay'
+    description = 'Managed files'
 
-def process_repos(org_name, repo_names, template_dir, branches, github_token, files_to_remove=None):
-    """Process the list of repositories to manage files and update branches, with optional file/folder removal."""
-    original_working_dir = os.getcwd()
+    def sparse_paths(self):
+        return template_sparse_paths(self.template_dir, self.files_to_remove)
 
-    for repo_name in repo_names:
-        # Clone the repository
-        clone_repo(org_name, repo_name, github_token)
+    def parameters(self):
+        return [Path(self.template_dir), self.files_to_remove]
 
-        # Change directory to the cloned repository
-        os.chdir(repo_name)
+    def apply(self, repo_path, branch):
+        return manage_files_in_repo(repo_path, self.template_dir, self.files_to_remove)
 
-        for branch in branches:
-            # Checkout the branch
-            checkout_branch(branch)
 
-            # Manage files (copy and replace from template directory) and remove specified files
-            if manage_files_in_repo(Path(os.getcwd()), template_dir, files_to_remove):
-                # Commit and push changes to the current branch only if the template directory exists
-                commit_and_push_changes(branch,f"Managed files and pushed updates to {branch} branch")
+def process_repos(org_name, repo_names, template_dir, branches, github_token, files_to_remove=None,
+                  max_workers=DEFAULT_MAX_WORKERS, cache=None, profile=SPARSE_CLONE, engine='worktree', index=None,
+                  plan_only=False):
+    """
+    Process the list of repositories to manage files and update branches, with optional file/folder removal.
 
-        # Return to the original working directory
-        os.chdir(original_working_dir)
+    The 'worktree' engine checks out each branch and copies the files with manage_files_in_repo.
+    The 'plumbing' engine builds the new commits directly from the template files without any checkout.
+    The 'api' engine commits the template files through the GitHub API without cloning (for small templates).
+    With a RepoIndex only the branches that changed since the template was last applied are processed.
+    With plan_only the plan of the run is printed and nothing is cloned or written.
+    """
+    commit_message = lambda branch: f"Managed files and pushed updates to {branch} branch"
+    steps = [OverlayStep(template_dir, files_to_remove)]
 
-        # Optionally, remove the cloned repository folder after processing
-        shutil.rmtree(repo_name)
+    if engine in ('plumbing', 'api') and not plan_only:
+        if not Path(template_dir).exists():
+            print(f"Error: Template directory {template_dir} does not exist.")
+            return []
+        if engine == 'api':
+            return run_api_batch(org_name, repo_names, branches, overlay_edits(read_overlay(template_dir)),
+                                 commit_message, files_to_remove, max_workers, index, pipeline_operation(steps))
+        return run_overlay_batch(org_name, repo_names, branches, github_token, read_overlay(template_dir),
+                                 commit_message, files_to_remove, max_workers, cache, profile,
+                                 index=index, operation=pipeline_operation(steps))
 
-    print(f"Repositories processed successfully in {org_name}")
+    # Commit and push changes to each branch only if files were written or removed
+    return run_pipeline(org_name, repo_names, branches, github_token, steps, commit_message, max_workers, cache,
+                        profile, index, plan_only)
 
 
 def main():
@@ -167,6 +218,19 @@ def main():
     # Branches to update
     branches = ['main', 'solution']
 
+    # Number of repositories processed at the same time
+    max_workers = 8
+
+    # 'worktree' checks out the branches and copies the files, 'plumbing' commits the template files without
+    # checking out the branches, 'api' commits them through the GitHub API without any clone (opt-in)
+    engine = 'worktree'
+
+    # Only process the branches that changed since the last successful run
+    incremental = True
+
+    # Only print which repositories would be processed and what it would cost
+    plan_only = False
+
     # Load GitHub token from the environment
     load_dotenv()
     github_token = os.getenv('GITHUB_TOKEN')
@@ -176,7 +240,10 @@ def main():
         return
 
     # Process the repositories
-    process_repos(org_name, repo_names, template_dir, branches, github_token, files_to_remove)
+    process_repos(org_name, repo_names, template_dir, branches, github_token, files_to_remove, max_workers,
+                  MirrorCache(), engine=engine, index=RepoIndex() if incremental else None,
+                  plan_only=plan_only)
+    print_trace_summary()
 
 
 if __name__ == '__main__':
@@ -1,8 +1,11 @@
-import subprocess
+from dotenv import load_dotenv
+
+from command_runner import print_trace_summary
+from github_client import GitHubError, get_client
 
 def transfer_repos(repo_list, current_owner, new_owner):
     """
-    Transfers a list of repositories from one owner to another using the GitHub CLI.
+    Transfers a list of repositories from one owner to another using the GitHub REST API.
 
     Parameters:
     repo_list (list): List of repository names to be transferred.
@@ -12,16 +15,19 @@ def transfer_repos(repo_list, current_owner, new_owner):
     Returns:
     None
     """
+    client = get_client()
     for repo in repo_list:
-        command = f'gh api repos/{current_owner}/{repo}/transfer -f new_owner={new_owner}'
         try:
             print(f'Transferring repo {repo} from {current_owner} to {new_owner}')
-            subprocess.run(command, shell=True, check=True)
+            # Never retried, a transfer the server already started must not be sent again
+            client.post(f'repos/{current_owner}/{repo}/transfer', json={'new_owner': new_owner}, retry=False)
             print(f'Successfully transferred {repo}')
-        except subprocess.CalledProcessError as e:
+        except GitHubError as e:
             print(f'Failed to transfer {repo}: {e}')
 
 if __name__ == '__main__':
+    load_dotenv()
+
     # List of repositories to transfer
     repos_to_transfer = [
         "m319-lu04-a01-classroom",
@@ -91,4 +97,5 @@ if __name__ == '__main__':
     new_owner = "templates-python"
 
     # Transfer the repositories
-    transfer_repos(repos_to_transfer, current_owner, new_owner)
\ No newline at end of file
+    transfer_repos(repos_to_transfer, current_owner, new_owner)
+    print_trace_summary()
\ No newline at end of file
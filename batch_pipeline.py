@@ -0,0 +1,60 @@
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+
+from batch_converter_old_to_new import AutogradingStep, LintStep
+from batch_file_manager import OverlayStep
+from batch_requirements_manager import RequirementsStep
+from command_runner import print_trace_summary
+from mirror_cache import MirrorCache
+from repo_index import RepoIndex
+from repo_pipeline import run_pipeline
+
+
+def main():
+    # List of repositories to process
+    repo_names = [
+        #"m319-lu04-a01-classroom",
+    ]
+
+    # GitHub organization name
+    org_name = "templates-python"
+
+    script_dir = Path(__file__).resolve().parent
+
+    # The steps applied to each branch in this order, all in one clone and one commit per branch
+    steps = [
+        AutogradingStep(script_dir / 'templates_for_repo_converter', lint=False),
+        OverlayStep(script_dir / 'templates_for_add_run_pylint'),
+        RequirementsStep(packages_to_add={"pylint": "3.2.7"}),
+        LintStep(),
+    ]
+
+    # Branches to update
+    branches = ['main', 'solution']
+
+    # Number of repositories processed at the same time
+    max_workers = 8
+
+    # Only process the branches that changed since the same steps were last applied
+    incremental = True
+
+    # Only print which repositories would be processed and what it would cost
+    plan_only = False
+
+    # Load GitHub token from the environment
+    load_dotenv()
+    github_token = os.getenv('GITHUB_TOKEN')
+
+    if not github_token:
+        print("Error: GITHUB_TOKEN not found in environment.")
+        return
+
+    # Process the repositories
+    run_pipeline(org_name, repo_names, branches, github_token, steps, max_workers=max_workers, cache=MirrorCache(),
+                 index=RepoIndex() if incremental else None, plan_only=plan_only)
+    print_trace_summary()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
-import subprocess
 from dotenv import load_dotenv
 import os
 
+from command_runner import print_trace_summary, run_command, trace_context
+
 
 def make_repo_template(org_name, repo_name):
     """Set the repository as a template using GitHub CLI."""
@@ -9,7 +10,8 @@ def make_repo_template(org_name, repo_name):
     print(f"Setting {repo_full_name} as a template repository")
 
     # Use GitHub CLI to edit the repository and set it as a template
-    subprocess.run(['gh', 'repo', 'edit', repo_full_name, '--template'])
+    with trace_context(repo=repo_name):
+        run_command(['gh', 'repo', 'edit', repo_full_name, '--template'])
 
 
 def make_repos_templates(org_name, repo_names):
@@ -85,6 +87,7 @@ def main():
 
     # Repositories zu Template-Repositories machen
     make_repos_templates(org_name, repo_names)
+    print_trace_summary()
 
 
 if __name__ == '__main__':
@@ -1,14 +1,25 @@
 import os
-import shutil
+from dataclasses import dataclass
 from pathlib import Path
 from dotenv import load_dotenv
 
-from git_utils import clone_repo, checkout_branch, commit_and_push_changes
+from api_editor import FileEdit, run_api_batch
+from command_runner import print_trace_summary
+from git_utils import SPARSE_CLONE
+from mirror_cache import MirrorCache
+from repo_executor import DEFAULT_MAX_WORKERS
+from repo_index import RepoIndex
+from repo_pipeline import pipeline_operation, run_pipeline
+from requirements_file import update_requirements
+
+# The only file a sparse clone needs to check out
+SPARSE_PATHS = ['/requirements.txt']
 
 
 def manage_requirements_file(repo_path, packages_to_add=None, packages_to_remove=None):
     """
     Manage the requirements.txt file to add, update, or remove specified packages.
+    Comments, specifiers, extras and markers of the other lines are kept (see requirements_file.py).
 
     Args:
         repo_path (Path): The path to the repository.
@@ -16,77 +27,64 @@ def manage_requirements_file(repo_path, packages_to_add=None, packages_to_remove
                                 e.g., {"pylint": "3.2.6", "requests": "2.25.1"}
         packages_to_remove (list): A list of packages to remove.
                                 e.g., ["unused_package"]
+
+    Returns:
+        bool: True if requirements.txt was created or changed.
     """
     requirements_path = Path(repo_path) / "requirements.txt"
 
-    # If the file doesn't exist, create it and add the packages_to_add
-    if not requirements_path.exists():
-        with open(requirements_path, 'w', encoding='utf-8') as req_file:
-            if packages_to_add:
-                for pkg, version in packages_to_add.items():
-                    req_file.write(f"{pkg}=={version}\n")
-        return
-
-    # Read the existing requirements file
-    with open(requirements_path, 'r', encoding='utf-8') as req_file:
-        lines = req_file.readlines()
-
-    updated_lines = []
-
-    # Check for each package in the current requirements file and update or remove if needed
-    for line in lines:
-        pkg_name = line.split('==')[0].strip()
-
-        # Remove package if it's in the remove list
-        if packages_to_remove and pkg_name in packages_to_remove:
-            continue
-
-        # Update package version if it's in the add/update list
-        if packages_to_add and pkg_name in packages_to_add:
-            updated_lines.append(f"{pkg_name}=={packages_to_add[pkg_name]}\n")
-            packages_to_add.pop(pkg_name)  # Remove from the dict to avoid adding it again later
-        else:
-            updated_lines.append(line)
+    # If the file doesn't exist, create it with the packages_to_add
+    text = None
+    if requirements_path.exists():
+        with open(requirements_path, 'r', encoding='utf-8', newline='') as req_file:
+            text = req_file.read()
+    updated_text = update_requirements(text or '', packages_to_add, packages_to_remove)
+    if updated_text == text:
+        return False
 
-    # Add any remaining packages that are in packages_to_add
-    if packages_to_add:
-        for pkg, version in packages_to_add.items():
-            updated_lines.append(f"{pkg}=={version}\n")
+    # Write the updated content back to requirements.txt, keeping its line endings
+    with open(requirements_path, 'w', encoding='utf-8', newline='') as req_file:
+        req_file.write(updated_text)
+    return True
 
-    # Write the updated content back to requirements.txt
-    with open(requirements_path, 'w', encoding='utf-8') as req_file:
-        req_file.writelines(updated_lines)
 
+@dataclass
+class RequirementsStep:
+    """Pipeline step adding, updating and removing packages in requirements.txt."""
+    packages_to_add: dict = None
+    packages_to_remove: list = None
+    name = 'requirements'
+    description = 'Updated requirements.txt'
 
-def process_repos(org_name, repo_names, packages_to_add, packages_to_remove, branches, github_token):
-    """Process the list of repositories and update their requirements.txt across multiple branches."""
-    for repo_name in repo_names:
-        # Clone the repository
-        clone_repo(org_name, repo_name, github_token)
+    def sparse_paths(self):
+        return SPARSE_PATHS
 
-        # Change directory to the cloned repository
-        os.chdir(repo_name)
+    def parameters(self):
+        return [self.packages_to_add, self.packages_to_remove]
 
-        # Iterate through the branches
-        for branch in branches:
-            # Checkout the branch
-            checkout_branch(branch)
+    def apply(self, repo_path, branch):
+        return manage_requirements_file(repo_path, self.packages_to_add, self.packages_to_remove)
 
-            # Update requirements.txt
-            manage_requirements_file(
-                Path(os.getcwd()), packages_to_add=packages_to_add, packages_to_remove=packages_to_remove
-            )
 
-            # Commit and push changes
-            commit_and_push_changes(branch,f"Updated requirements.txt with specified package versions on {branch} branch")
-
-        # Return to the parent directory
-        os.chdir('..')
+def process_repos(org_name, repo_names, packages_to_add, packages_to_remove, branches, github_token,
+                  max_workers=DEFAULT_MAX_WORKERS, cache=None, profile=SPARSE_CLONE, index=None, plan_only=False,
+                  engine='clone'):
+    """
+    Process the list of repositories and update their requirements.txt across multiple branches.
+    With a RepoIndex only the branches that changed since the same update was last applied are processed.
+    With plan_only the plan of the run is printed and nothing is cloned or written.
+    The 'api' engine edits requirements.txt through the GitHub API without cloning the repositories.
+    """
+    steps = [RequirementsStep(packages_to_add, packages_to_remove)]
+    commit_message = lambda branch: f"Updated requirements.txt with specified package versions on {branch} branch"
 
-        # Optionally, remove the cloned repository folder after processing
-        shutil.rmtree(repo_name)
+    if engine == 'api' and not plan_only:
+        edit = FileEdit(lambda text: update_requirements(text or '', packages_to_add, packages_to_remove))
+        return run_api_batch(org_name, repo_names, branches, {'requirements.txt': edit}, commit_message,
+                             max_workers=max_workers, index=index, operation=pipeline_operation(steps))
 
-    print(f"Repositories processed successfully in {org_name}")
+    return run_pipeline(org_name, repo_names, branches, github_token, steps, commit_message, max_workers, cache,
+                        profile, index, plan_only)
 
 
 def main():
@@ -109,6 +107,18 @@ def main():
     # Specify branches to process
     branches = ['main']  # List the branches you want to process
 
+    # Number of repositories processed at the same time
+    max_workers = 8
+
+    # Only process the branches that changed since the last successful run
+    incremental = True
+
+    # Only print which repositories would be processed and what it would cost
+    plan_only = False
+
+    # 'clone' edits a sparse clone of each repository, 'api' edits requirements.txt through the GitHub API (opt-in)
+    engine = 'clone'
+
     # Load GitHub token from the environment
     load_dotenv()
     github_token = os.getenv('GITHUB_TOKEN')
@@ -118,7 +128,9 @@ def main():
         return
 
     # Process the repositories
-    process_repos(org_name, repo_names, packages_to_add, packages_to_remove, branches, github_token)
+    process_repos(org_name, repo_names, packages_to_add, packages_to_remove, branches, github_token, max_workers,
+                  MirrorCache(), index=RepoIndex() if incremental else None, plan_only=plan_only, engine=engine)
+    print_trace_summary()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,130 @@
+import json
+import math
+import os
+import re
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+# JSON-lines file the trace is appended to, nothing is written if not set
+TRACE_FILE = os.getenv('PYGRADER_TRACE_FILE')
+
+_records = []
+_records_lock = threading.Lock()
+_context = threading.local()
+
+
+@contextmanager
+def trace_context(**fields):
+    """
+    Attach fields like repo, branch or phase to every command run in this thread within the block.
+    Worker threads don't inherit the context, so set it again in each worker.
+    """
+    previous = getattr(_context, 'fields', {})
+    _context.fields = {**previous, **fields}
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+
+def redact(text):
+    """Remove tokens from authenticated URLs."""
+    return re.sub(r'https://[^@/\s]+@', 'https://***@', str(text))
+
+
+def default_phase(args):
+    """Derive the phase from the command, e.g. 'git clone' or 'gh repo'."""
+    if isinstance(args, str):
+        args = args.split()
+    args = [str(arg) for arg in args]
+    words = [args[0]] + [arg for arg in args[1:] if not arg.startswith('-')][:1]
+    return ' '.join(os.path.basename(word) for word in words)
+
+
+def record(phase, duration, command=None, returncode=None, output_bytes=None, **fields):
+    """Record one traced operation and append it to the trace file."""
+    entry = {
+        'time': round(time.time() - duration, 3),
+        'phase': phase,
+        'command': command,
+        'duration': round(duration, 4),
+        'returncode': returncode,
+        'output_bytes': output_bytes,
+        **getattr(_context, 'fields', {}),
+        **fields,
+    }
+    with _records_lock:
+        _records.append(entry)
+        if TRACE_FILE:
+            with open(TRACE_FILE, 'a', encoding='utf-8') as trace_file:
+                trace_file.write(json.dumps(entry) + '\n')
+    return entry
+
+
+@contextmanager
+def timed(phase, **fields):
+    """Record the wall time of the block, e.g. the Python part of a batch step."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start, **fields)
+
+
+def run_command(args, phase=None, **kwargs):
+    """
+    Run a command like subprocess.run and record its wall time, return code and output size.
+    The output size is only known when the output is captured.
+    """
+    start = time.perf_counter()
+    returncode = None
+    output_bytes = None
+    try:
+        result = subprocess.run(args, **kwargs)
+        returncode = result.returncode
+        if result.stdout is not None or result.stderr is not None:
+            output_bytes = sum(len(output) for output in (result.stdout, result.stderr) if output)
+        return result
+    except subprocess.CalledProcessError as e:
+        returncode = e.returncode
+        raise
+    finally:
+        command = redact(args if isinstance(args, str) else ' '.join(str(arg) for arg in args))
+        record(phase or default_phase(args), time.perf_counter() - start, command, returncode, output_bytes)
+
+
+def percentile(values, percent):
+    """Return the percentile of the values using the nearest-rank method."""
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def print_trace_summary(slowest=5):
+    """Print the count, p50, p95, max and total wall time per phase and the slowest repositories."""
+    with _records_lock:
+        records = list(_records)
+    if not records:
+        return
+
+    phases = {}
+    repos = {}
+    for entry in records:
+        phases.setdefault(entry['phase'], []).append(entry['duration'])
+        if entry.get('repo'):
+            repos.setdefault(entry['repo'], {}).setdefault(entry['phase'] == 'repo', []).append(entry['duration'])
+    # Prefer the wall time of the whole repository over the sum of its commands
+    repos = {repo: sum(durations.get(True) or durations[False]) for repo, durations in repos.items()}
+
+    print(f"\n{'phase':<24}{'count':>7}{'p50':>9}{'p95':>9}{'max':>9}{'total':>10}")
+    for phase, durations in sorted(phases.items(), key=lambda item: -sum(item[1])):
+        print(f"{phase:<24}{len(durations):>7}{percentile(durations, 50):>8.2f}s{percentile(durations, 95):>8.2f}s"
+              f"{max(durations):>8.2f}s{sum(durations):>9.1f}s")
+
+    if repos:
+        print('\nSlowest repositories:')
+        for repo, duration in sorted(repos.items(), key=lambda item: -item[1])[:slowest]:
+            print(f"  {repo}: {duration:.1f}s")
+    if TRACE_FILE:
+        print(f"\nTrace written to {TRACE_FILE}")
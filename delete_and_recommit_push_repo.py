@@ -1,5 +1,5 @@
 import os
-import subprocess
+from command_runner import print_trace_summary, run_command, trace_context
 from git_utils import clone_repo
 from dotenv import load_dotenv
 
@@ -11,8 +11,8 @@ def clone_repo_with_branches(org_name, repo_name, github_token, branches):
     os.chdir(repo_name)
     for branch in branches:
         # Fetch and checkout each branch
-        subprocess.run(['git', 'checkout', branch])
-        subprocess.run(['git', 'pull', 'origin', branch])
+        run_command(['git', 'checkout', branch])
+        run_command(['git', 'pull', 'origin', branch])
     os.chdir('../')
 
 
@@ -20,13 +20,13 @@ def delete_repo(org_name, repo_name):
     """Delete the repository on GitHub using the GitHub CLI."""
     repo_full_name = f'{org_name}/{repo_name}'
     print(f"Deleting repo: {repo_full_name}")
-    subprocess.run(['gh', 'repo', 'delete', repo_full_name, '--yes'])
+    run_command(['gh', 'repo', 'delete', repo_full_name, '--yes'])
 
 
 def create_repo(org_name, repo_name):
     """Create the repository again on GitHub using the GitHub CLI."""
     #print(f"Creating repo: {repo_name} under {org_name}")
-    subprocess.run(['gh', 'repo', 'create', f'{org_name}/{repo_name}', '--public'])
+    run_command(['gh', 'repo', 'create', f'{org_name}/{repo_name}', '--public'])
 
 
 def push_branches(repo_name, branches):
@@ -35,8 +35,8 @@ def push_branches(repo_name, branches):
 
     for branch in branches:
         #print(f"Pushing branch: {branch} to {repo_name}")
-        subprocess.run(['git', 'checkout', branch])
-        subprocess.run(['git', 'push', '--set-upstream', 'origin', branch])
+        run_command(['git', 'checkout', branch])
+        run_command(['git', 'push', '--set-upstream', 'origin', branch])
 
     os.chdir('../')
 
@@ -48,17 +48,18 @@ def manage_repos(org_name, repo_names, github_token):
     for repo_name in repo_names:
         print(f"Processing repo: {repo_name}")
 
-        # Step 1: Clone the repository with the specified branches
-        clone_repo_with_branches(org_name, repo_name, github_token, branches)
+        with trace_context(repo=repo_name):
+            # Step 1: Clone the repository with the specified branches
+            clone_repo_with_branches(org_name, repo_name, github_token, branches)
 
-        # Step 2: Delete the repository on GitHub using gh CLI
-        delete_repo(org_name, repo_name)
+            # Step 2: Delete the repository on GitHub using gh CLI
+            delete_repo(org_name, repo_name)
 
-        # Step 3: Recreate the repository
-        create_repo(org_name, repo_name)
+            # Step 3: Recreate the repository
+            create_repo(org_name, repo_name)
 
-        # Step 4: Push the main and solution branches to the new remote repository
-        push_branches(repo_name, branches)
+            # Step 4: Push the main and solution branches to the new remote repository
+            push_branches(repo_name, branches)
 
 
 def main():
@@ -128,6 +129,7 @@ def main():
 
     # Manage the repositories
     manage_repos(org_name, repo_names, github_token)
+    print_trace_summary()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,156 @@
+import html
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from github_client import GitHubError, get_client
+from list_all_repos_in_org_with_filter import iter_repos
+from org_inventory import fetch_repos_inventory
+
+# Number of pairs compared at the same time
+DEFAULT_MAX_WORKERS = 8
+
+
+def tree_files(org_name, repo_name, tree):
+    """
+    Return the files of a tree as a dict mapping each path to its blob, and whether GitHub truncated the listing.
+    Trees never change, so the response is answered from the HTTP cache on later runs.
+    """
+    data = get_client().get_json(f'repos/{org_name}/{repo_name}/git/trees/{tree}', {'recursive': '1'})
+    files = {entry['path']: entry['sha'] for entry in data['tree'] if entry['type'] == 'blob'}
+    return files, data.get('truncated', False)
+
+
+def compare_trees(source_org, source_repo, source_tree, target_org, target_repo, target_tree):
+    """Return the drift of one branch: the changed files and the files only in the template or the classroom repo."""
+    if source_tree == target_tree:
+        return {'status': 'identical'}
+    source_files, source_truncated = tree_files(source_org, source_repo, source_tree)
+    target_files, target_truncated = tree_files(target_org, target_repo, target_tree)
+    return {
+        'status': 'drifted',
+        'changed': sorted(path for path in source_files if path in target_files
+                          and source_files[path] != target_files[path]),
+        'only_in_template': sorted(set(source_files) - set(target_files)),
+        'only_in_classroom': sorted(set(target_files) - set(source_files)),
+        'truncated': source_truncated or target_truncated,
+    }
+
+
+def build_drift_report(source_org, target_org, pairs, branches, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Compare all template/classroom pairs on all branches concurrently, without cloning or pushing.
+
+    The branch trees of all repositories are looked up with a few GraphQL requests; only the
+    branches whose trees differ are listed file by file through the git trees API.
+
+    Parameters:
+    pairs (list): (template repository, classroom repository) name pairs.
+
+    Returns:
+    dict: The report, with one entry per pair mapping each branch to its drift.
+    """
+    sources = fetch_repos_inventory(source_org, sorted({source for source, _ in pairs}), branches)
+    targets = fetch_repos_inventory(target_org, sorted({target for _, target in pairs}), branches)
+
+    def compare_branch(source_repo, target_repo, branch):
+        source, target = sources[source_repo], targets[target_repo]
+        if source is None or target is None:
+            return {'status': 'missing', 'message': 'repository does not exist'}
+        if not (source.trees.get(branch) and target.trees.get(branch)):
+            return {'status': 'missing', 'message': 'branch does not exist'}
+        try:
+            return compare_trees(source_org, source_repo, source.trees[branch],
+                                 target_org, target_repo, target.trees[branch])
+        except GitHubError as e:
+            return {'status': 'error', 'message': str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {(source_repo, target_repo, branch): executor.submit(compare_branch, source_repo, target_repo, branch)
+                   for source_repo, target_repo in pairs for branch in branches}
+        repos = [{'template': source_repo, 'classroom': target_repo,
+                  'branches': {branch: futures[(source_repo, target_repo, branch)].result() for branch in branches}}
+                 for source_repo, target_repo in pairs]
+
+    return {
+        'generated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'source_org': source_org,
+        'target_org': target_org,
+        'branches': list(branches),
+        'repos': repos,
+    }
+
+
+def report_pairs(target_org, repo_names, target_name=None, target_pattern=None):
+    """
+    Return the template/classroom pairs to compare: each template with the classroom repositories
+    matching target_pattern (e.g. '{repo_name}-*'), or with the single repository named by target_name.
+    """
+    if target_pattern:
+        return [(repo_name, target) for repo_name in repo_names
+                for target in iter_repos(target_org, pattern=target_pattern.format(repo_name=repo_name), ordered=True)]
+    return [(repo_name, target_name(target_org, repo_name)) for repo_name in repo_names]
+
+
+def write_json_report(report, path):
+    """Write the report as JSON."""
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+
+
+def write_html_report(report, path):
+    """Write a static HTML summary of the report, listing the drifted files per repository and branch."""
+    rows = []
+    for repo in report['repos']:
+        for branch, drift in repo['branches'].items():
+            details = ''
+            if drift['status'] == 'drifted':
+                for title, key in (('Changed', 'changed'), ('Only in template', 'only_in_template'),
+                                   ('Only in classroom', 'only_in_classroom')):
+                    if drift[key]:
+                        files = ''.join(f'<li>{html.escape(path)}</li>' for path in drift[key])
+                        details += f'<details><summary>{title} ({len(drift[key])})</summary><ul>{files}</ul></details>'
+                if drift['truncated']:
+                    details += '<p>The file list was truncated by GitHub.</p>'
+            elif drift.get('message'):
+                details = html.escape(drift['message'])
+            rows.append(f"<tr class=\"{drift['status']}\"><td>{html.escape(repo['template'])}</td>"
+                        f"<td>{html.escape(repo['classroom'])}</td><td>{html.escape(branch)}</td>"
+                        f"<td>{drift['status']}</td><td>{details}</td></tr>")
+
+    counts = summarize(report)
+    summary = ', '.join(f'{count} {status}' for status, count in sorted(counts.items()))
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Drift {html.escape(report['source_org'])} / {html.escape(report['target_org'])}</title>
+<style>
+body {{ font-family: sans-serif; }}
+table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #ccc; padding: 4px 8px; text-align: left; vertical-align: top; }}
+tr.identical td {{ color: #888; }}
+tr.drifted {{ background: #fff3cd; }}
+tr.missing, tr.error {{ background: #f8d7da; }}
+</style>
+</head>
+<body>
+<h1>Drift between {html.escape(report['source_org'])} and {html.escape(report['target_org'])}</h1>
+<p>Generated {report['generated']}: {summary}</p>
+<table>
+<tr><th>Template</th><th>Classroom</th><th>Branch</th><th>Status</th><th>Files</th></tr>
+{chr(10).join(rows)}
+</table>
+</body>
+</html>
+""")
+
+
+def summarize(report):
+    """Return the number of branches per status."""
+    counts = {}
+    for repo in report['repos']:
+        for drift in repo['branches'].values():
+            counts[drift['status']] = counts.get(drift['status'], 0) + 1
+    return counts
@@ -1,35 +1,326 @@
-import subprocess
+import os
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
 
+from command_runner import run_command
 
-def clone_repo(org_name, repo_name, github_token):
-    """Clone the GitHub repository using the provided organization name and repository name."""
-    repo_url = f"https://{github_token}@github.com/{org_name}/{repo_name}.git"
-    subprocess.run(["git", "clone", repo_url])
 
+def get_repo_url(org_name, repo_name, github_token):
+    """Return the authenticated HTTPS URL of the GitHub repository."""
+    return f"https://{github_token}@github.com/{org_name}/{repo_name}.git"
 
-def checkout_branch(branch_name):
+
+@dataclass(frozen=True)
+class CloneProfile:
+    """
+    Selects how much of a repository is cloned.
+
+    depth: Only fetch the last commits of the cloned branches (None = full history).
+    blob_filter: Partial clone filter, e.g. 'blob:none' fetches file contents only when they are checked out.
+    sparse: Only check out the sparse paths declared by the caller.
+    """
+    depth: int = None
+    blob_filter: str = None
+    sparse: bool = False
+
+
+FULL_CLONE = CloneProfile()
+SHALLOW_CLONE = CloneProfile(depth=1)
+BLOBLESS_CLONE = CloneProfile(blob_filter='blob:none')
+SPARSE_CLONE = CloneProfile(depth=1, blob_filter='blob:none', sparse=True)
+
+
+def clone_repo(org_name, repo_name, github_token, cwd=None, cache=None, profile=FULL_CLONE, branches=None,
+               sparse_paths=None, no_checkout=False, bare=False):
+    """
+    Clone the GitHub repository using the provided organization name and repository name.
+    With a MirrorCache the working copy is created from the local mirror, which only fetches new objects.
+    Otherwise the profile selects a shallow, single-branch and/or partial clone of the listed branches.
+    With a sparse profile only the sparse_paths (gitignore-style patterns, e.g. '/requirements.txt') are checked out.
+    With no_checkout nothing is checked out, e.g. when the branches are checked out with branch_worktrees.
+    A bare clone has no working tree at all, its branches are edited with commit_overlay.
+    Returns the path of the cloned repository.
+    """
+    sparse = profile.sparse and bool(sparse_paths) and not (no_checkout or bare)
+    repo_path = os.path.join(cwd or os.getcwd(), repo_name)
+
+    if cache is not None:
+        cache.clone(org_name, repo_name, github_token, cwd=cwd, no_checkout=sparse or no_checkout, bare=bare)
+    else:
+        repo_url = get_repo_url(org_name, repo_name, github_token)
+        args = ["git", "clone"]
+        if profile.depth:
+            args += ["--depth", str(profile.depth)]
+            if branches:
+                args += ["--branch", branches[0]]
+        if profile.blob_filter:
+            args += [f"--filter={profile.blob_filter}"]
+        if bare:
+            args += ["--bare"]
+        elif sparse or no_checkout:
+            args += ["--no-checkout"]
+        run_command(args + [repo_url, repo_path], cwd=cwd)
+
+        # A shallow clone of a branch is single-branch, so fetch the other branches explicitly
+        if profile.depth and branches and len(branches) > 1 and os.path.isdir(repo_path):
+            fetch_branches(branches[1:], profile.depth, cwd=repo_path)
+
+    if sparse and os.path.isdir(repo_path):
+        run_command(["git", "sparse-checkout", "set", "--no-cone", *sparse_paths], cwd=repo_path, check=True)
+        result = run_command(["git", "symbolic-ref", "--short", "HEAD"], cwd=repo_path,
+                             capture_output=True, text=True)
+        checkout_branch(branches[0] if branches else result.stdout.strip(), cwd=repo_path)
+    return repo_path
+
+
+def fetch_branches(branch_names, depth=None, cwd=None):
+    """Add the branches to a single-branch clone and fetch them. Branches missing on the remote are skipped."""
+    depth_args = ["--depth", str(depth)] if depth else []
+    run_command(["git", "remote", "set-branches", "--add", "origin", *branch_names], cwd=cwd)
+    result = run_command(["git", "fetch", *depth_args, "origin", *branch_names], cwd=cwd)
+    if result.returncode != 0 and len(branch_names) > 1:
+        # One missing branch fails the whole fetch, so fall back to fetching the branches one by one
+        for branch_name in branch_names:
+            run_command(["git", "fetch", *depth_args, "origin", branch_name], cwd=cwd)
+
+
+def checkout_branch(branch_name, cwd=None):
     """Checkout the specified branch. Print a message if the branch doesn't exist."""
-    subprocess.run(["git", "checkout", branch_name])
+    run_command(["git", "checkout", branch_name], cwd=cwd)
 
 
-def commit_and_push_changes(branch_name, commit_message):
-    """Commit the changes and attempt to push to the specified branch. Print a message if the branch doesn't exist remotely."""
-    # Check if there are any changes to commit
-    result = subprocess.run(["git", "status", "--porcelain"], capture_output=True, text=True)
-    if not result.stdout.strip():
+def add_worktree(repo_path, branch_name, worktree_path, sparse_paths=None):
+    """
+    Check out the branch into its own worktree, which shares the object store of the clone.
+    With sparse_paths only those paths are checked out. Returns False if the branch doesn't exist.
+    """
+    args = ["git", "worktree", "add", "--quiet"] + (["--no-checkout"] if sparse_paths else [])
+    result = run_command(args + [worktree_path, branch_name], cwd=repo_path)
+    if result.returncode != 0:
+        print(f"Branch {branch_name} could not be checked out into a worktree.")
+        return False
+
+    if sparse_paths:
+        run_command(["git", "sparse-checkout", "set", "--no-cone", *sparse_paths], cwd=worktree_path, check=True)
+        checkout_branch(branch_name, cwd=worktree_path)
+    return True
+
+
+@contextmanager
+def branch_worktrees(repo_path, branches, sparse_paths=None):
+    """
+    Create one worktree per branch next to the clone and remove them again afterwards.
+    Yields a dict mapping each branch that exists to the path of its worktree.
+    """
+    # A branch can only be checked out in one worktree, so detach the HEAD of the clone itself
+    run_command(["git", "update-ref", "--no-deref", "HEAD", "HEAD"], cwd=repo_path, check=True)
+
+    worktrees = {}
+    try:
+        for branch in branches:
+            worktree_path = f"{repo_path}-{branch.replace('/', '-')}"
+            if add_worktree(repo_path, branch, worktree_path, sparse_paths):
+                worktrees[branch] = worktree_path
+        yield worktrees
+    finally:
+        for worktree_path in worktrees.values():
+            run_command(["git", "worktree", "remove", "--force", worktree_path], cwd=repo_path)
+
+
+def read_overlay(template_dir):
+    """Return the files of the template directory as overlay, a dict mapping each relative path to its file."""
+    template_dir = Path(template_dir)
+    return {item.relative_to(template_dir).as_posix(): item for item in sorted(template_dir.rglob('*'))
+            if item.is_file()}
+
+
+def rev_parse(repo_path, revision):
+    """Return the object name of the revision, or None if it doesn't exist."""
+    result = run_command(["git", "rev-parse", "--verify", "--quiet", revision],
+                         cwd=repo_path, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def resolve_branch(repo_path, branch_name):
+    """Return the commit of the local or remote-tracking branch, or None if the branch doesn't exist."""
+    return (rev_parse(repo_path, f"refs/heads/{branch_name}^{{commit}}")
+            or rev_parse(repo_path, f"refs/remotes/origin/{branch_name}^{{commit}}"))
+
+
+def commit_overlay(repo_path, branch_name, overlay, commit_message, paths_to_remove=None):
+    """
+    Commit the overlay files and removals onto a branch without checking it out.
+
+    The new tree is built from the tree of the branch in a temporary index, so only the changed
+    files are hashed and written. This works in bare clones and mirrors.
+
+    Args:
+        repo_path (str): The path to the (bare) repository.
+        branch_name (str): The branch to commit to.
+        overlay (dict): Maps the relative paths in the repository to the local files to write there.
+        commit_message (str): The commit message.
+        paths_to_remove (list): Files or folders to remove from the branch.
+
+    Returns:
+        str: The new commit, or None if the branch doesn't exist or nothing changed.
+    """
+    # Write all blobs with a single git process
+    paths = list(overlay)
+    blobs = run_command(["git", "hash-object", "-w", "--stdin-paths"], cwd=repo_path, capture_output=True, text=True,
+                        input=''.join(f"{overlay[path]}\n" for path in paths), check=True).stdout.split()
+    entries = {}
+    for path, blob in zip(paths, blobs):
+        mode = '100755' if os.stat(overlay[path]).st_mode & stat.S_IXUSR else '100644'
+        entries[path] = (mode, blob)
+    return commit_entries(repo_path, branch_name, entries, commit_message, paths_to_remove)
+
+
+def commit_entries(repo_path, branch_name, entries, commit_message, paths_to_remove=None):
+    """
+    Commit tree entries onto a branch without checking it out.
+
+    Args:
+        entries (dict): Maps the relative paths to (mode, object) of blobs that already exist in the
+                        repository or one of its alternates, e.g. taken from ls_tree of another clone.
+
+    Returns:
+        str: The new commit, or None if the branch doesn't exist or nothing changed.
+    """
+    local_head = rev_parse(repo_path, f"refs/heads/{branch_name}^{{commit}}")
+    parent = local_head or resolve_branch(repo_path, branch_name)
+    if parent is None:
+        print(f"Branch {branch_name} does not exist. No commit was made.")
+        return None
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        env = dict(os.environ, GIT_INDEX_FILE=os.path.join(temp_dir, 'index'))
+
+        def git(*args, stdin=None):
+            return run_command(["git", *args], cwd=repo_path, env=env, input=stdin,
+                               capture_output=True, text=True, check=True).stdout
+
+        git("read-tree", parent)
+        index_info = []
+
+        # Mode 0 removes an entry from the index
+        if paths_to_remove:
+            removed = git("ls-tree", "-r", "--name-only", parent, "--", *paths_to_remove).splitlines()
+            index_info += [f"0 {'0' * 40}\t{path}" for path in removed]
+
+        index_info += [f"{mode} {blob}\t{path}" for path, (mode, blob) in entries.items()]
+        git("update-index", "--index-info", stdin=''.join(f"{line}\n" for line in index_info))
+        tree = git("write-tree").strip()
+        if tree == rev_parse(repo_path, f"{parent}^{{tree}}"):
+            print(f"No changes to commit on branch {branch_name}.")
+            return None
+        commit = git("commit-tree", tree, "-p", parent, "-m", commit_message).strip()
+
+    # Only move the branch if nobody else changed it in the meantime
+    old_value = local_head or '0' * 40
+    run_command(["git", "update-ref", f"refs/heads/{branch_name}", commit, old_value], cwd=repo_path, check=True)
+    return commit
+
+
+def ls_tree(repo_path, revision):
+    """Return the files of the revision as a dict mapping each path to (mode, object)."""
+    result = run_command(["git", "ls-tree", "-r", "-z", "--full-tree", revision], cwd=repo_path,
+                         capture_output=True, text=True, check=True)
+    manifest = {}
+    for line in filter(None, result.stdout.split('\0')):
+        info, path = line.split('\t', 1)
+        mode, object_type, object_name = info.split()
+        if object_type == 'blob':
+            manifest[path] = (mode, object_name)
+    return manifest
+
+
+def add_alternate(repo_path, other_repo_path):
+    """Let the repository read the objects of another local repository, e.g. to commit blobs of a template clone."""
+    def objects_dir(path):
+        result = run_command(["git", "rev-parse", "--git-path", "objects"], cwd=path,
+                             capture_output=True, text=True, check=True)
+        return os.path.abspath(os.path.join(path, result.stdout.strip()))
+
+    alternates_file = os.path.join(objects_dir(repo_path), 'info', 'alternates')
+    os.makedirs(os.path.dirname(alternates_file), exist_ok=True)
+    with open(alternates_file, 'a', encoding='utf-8') as file:
+        file.write(objects_dir(other_repo_path) + '\n')
+
+
+def fetched_branches(repo_path):
+    """
+    Return the names of the branches that exist on the remote, as known from the clone or last fetch.
+    In a bare clone these are the local branches, otherwise the remote-tracking branches of origin.
+    """
+    bare = run_command(["git", "rev-parse", "--is-bare-repository"], cwd=repo_path,
+                       capture_output=True, text=True).stdout.strip() == 'true'
+    refs = ["refs/heads/"] if bare else []
+    result = run_command(["git", "for-each-ref", "--format=%(refname)", "refs/remotes/origin/", *refs],
+                         cwd=repo_path, capture_output=True, text=True)
+    branches = set()
+    for ref in result.stdout.split():
+        branch = ref.removeprefix("refs/remotes/origin/").removeprefix("refs/heads/")
+        if branch != 'HEAD':
+            branches.add(branch)
+    return branches
+
+
+def commit_changes(branch_name, commit_message, cwd=None):
+    """Commit all changes in the working tree. Returns False if there was nothing to commit."""
+    run_command(["git", "add", "."], cwd=cwd)
+    if run_command(["git", "diff", "--cached", "--quiet"], cwd=cwd).returncode == 0:
         print(f"No changes to commit on branch {branch_name}.")
-        return
-
-    # Commit changes if there are any
-    subprocess.run(["git", "add", "."])
-    subprocess.run(
-        ["git", "commit", "-m", commit_message],
-        check=True
-    )
-
-    # Check if the branch exists on remote before pushing
-    result = subprocess.run(["git", "ls-remote", "--heads", "origin", branch_name], capture_output=True, text=True)
-    if branch_name in result.stdout:
-        subprocess.run(["git", "push", "origin", branch_name])
-    else:
-        print(f"Branch {branch_name} does not exist on remote. No push was made.")
+        return False
+
+    run_command(["git", "commit", "--quiet", "-m", commit_message], check=True, cwd=cwd)
+    return True
+
+
+class RepoTransaction:
+    """
+    Collects the commits on several branches of a clone and pushes them together.
+
+    Whether a branch exists on the remote is checked against the refs the clone already fetched,
+    and all branches are sent with a single atomic push: either every branch is updated or none.
+    """
+
+    def __init__(self, repo_path):
+        self.repo_path = repo_path
+        self.remote_branches = fetched_branches(repo_path)
+        self.branches = []
+        self._lock = threading.Lock()
+
+    def add(self, branch_name):
+        """Push the branch with the transaction. Returns False if the branch doesn't exist on the remote."""
+        if branch_name not in self.remote_branches:
+            print(f"Branch {branch_name} does not exist on remote. No push was made.")
+            return False
+        with self._lock:
+            if branch_name not in self.branches:
+                self.branches.append(branch_name)
+        return True
+
+    def commit(self, branch_name, commit_message, cwd=None):
+        """Commit the changes in the working tree of the branch (the clone or a worktree) and add the branch."""
+        return commit_changes(branch_name, commit_message, cwd or self.repo_path) and self.add(branch_name)
+
+    def push(self):
+        """Push all added branches with one atomic push. Returns False if the push was rejected."""
+        if not self.branches:
+            return True
+        result = run_command(["git", "push", "--atomic", "origin", *self.branches], cwd=self.repo_path)
+        if result.returncode != 0:
+            print(f"Push of {', '.join(self.branches)} failed. No branch was updated.")
+            return False
+        return True
+
+
+def commit_and_push_changes(branch_name, commit_message, cwd=None):
+    """Commit the changes and attempt to push to the specified branch. Print a message if the branch doesn't exist remotely."""
+    transaction = RepoTransaction(cwd or os.getcwd())
+    transaction.commit(branch_name, commit_message)
+    return transaction.push()
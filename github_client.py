@@ -0,0 +1,192 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from command_runner import record
+from http_cache import HttpCache
+
+# Base URL of the REST API, GITHUB_API_URL can point to a local fake API server for testing
+DEFAULT_API_URL = 'https://api.github.com'
+
+# Server errors that are retried with exponential backoff
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+
+# Methods that are safe to send again after a server error or a lost connection, the server may have acted
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+
+class GitHubError(Exception):
+    """Raised when a GitHub API request fails after all retries."""
+
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+
+
+class GitHubClient:
+    """
+    GitHub REST client on a shared requests.Session with keep-alive connection pooling.
+
+    Server errors and connection failures of idempotent requests are retried with exponential backoff,
+    a POST or PATCH only with retry=True. Secondary rate limits (Retry-After) and an exhausted rate
+    limit (X-RateLimit-Remaining: 0) are waited out for all requests, the server didn't act on those.
+    The client is thread-safe, so the workers of a batch run can share one instance.
+    With an HttpCache, GET requests are sent as conditional requests and a 304 is served from the cache.
+    """
+
+    def __init__(self, github_token=None, base_url=None, max_retries=5, backoff=1.0, pool_size=16, timeout=30,
+                 cache=None):
+        self.base_url = (base_url or os.getenv('GITHUB_API_URL', DEFAULT_API_URL)).rstrip('/')
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/vnd.github+json',
+            'X-GitHub-Api-Version': '2022-11-28',
+        })
+        if github_token:
+            self.session.headers['Authorization'] = f'token {github_token}'
+        self._rate_limit_reset = 0
+        self._lock = threading.Lock()
+
+    def url(self, path):
+        """Return the absolute URL for an API path like 'orgs/{org}/repos'."""
+        if path.startswith(('http://', 'https://')):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, retry=None, **kwargs):
+        """
+        Send a request and return the response.
+        retry decides whether server errors and connection failures are retried; by default only idempotent
+        methods are, e.g. a repository transfer is never sent twice.
+        Raises GitHubError if the request still fails after all retries.
+        """
+        url = self.url(path)
+        if retry is None:
+            retry = method in IDEMPOTENT_METHODS
+        kwargs.setdefault('timeout', self.timeout)
+
+        cache_key = cache_entry = None
+        if self.cache is not None and method == 'GET':
+            full_url = requests.Request(method, url, params=kwargs.pop('params', None)).prepare().url
+            url = full_url
+            cache_key = self.cache.key(full_url, self.session.headers.get('Authorization'))
+            cache_entry = self.cache.get(cache_key)
+            if cache_entry:
+                kwargs['headers'] = {**kwargs.get('headers', {}), **self.cache.validators(cache_entry)}
+
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_rate_limit()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                record(f'http {method}', time.perf_counter() - start, f'{method} {url}', str(type(e).__name__))
+                if not retry or attempt == self.max_retries:
+                    raise GitHubError(f'{method} {url} failed: {e}') from e
+                time.sleep(self._backoff_delay(attempt))
+                continue
+
+            record(f'http {method}', time.perf_counter() - start, f'{method} {url}', response.status_code,
+                   len(response.content))
+            self._update_rate_limit(response)
+            delay = self._retry_delay(response, attempt, retry)
+            if delay is None or attempt == self.max_retries:
+                break
+            print(f'{method} {url} returned {response.status_code}, retrying in {delay:.0f}s')
+            time.sleep(delay)
+
+        if response.status_code == 304 and cache_entry:
+            return self.cache.response(cache_key, cache_entry)
+        if response.status_code >= 400:
+            raise GitHubError(f'{method} {url} failed: {response.status_code} {response.text[:200]}', response)
+        if cache_key:
+            self.cache.put(cache_key, response)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+
+    def get_json(self, path, params=None):
+        """Send a GET request and return the decoded JSON."""
+        return self.get(path, params=params).json()
+
+    def paginate(self, path, params=None):
+        """Yield the decoded JSON of each page, following the Link: next header."""
+        url = self.url(path)
+        while url:
+            response = self.get(url, params=params)
+            yield response.json()
+            url = response.links.get('next', {}).get('url')
+            params = None  # The next link already contains the query parameters
+
+    def graphql(self, query, variables=None, retry=True):
+        """
+        Send a GraphQL query and return its data.
+        Repositories or refs that don't exist come back as None, any other error raises GitHubError.
+        Queries only read, so they are retried like a GET; send mutations with retry=False.
+        """
+        graphql_url = os.getenv('GITHUB_GRAPHQL_URL', f'{self.base_url}/graphql')
+        payload = self.post(graphql_url, json={'query': query, 'variables': variables or {}}, retry=retry).json()
+        errors = [error for error in payload.get('errors', []) if error.get('type') != 'NOT_FOUND']
+        if errors or payload.get('data') is None:
+            raise GitHubError(f"GraphQL query failed: {errors or payload.get('errors')}")
+        return payload['data']
+
+    def _backoff_delay(self, attempt):
+        return self.backoff * 2 ** attempt * random.uniform(0.5, 1.0)
+
+    def _retry_delay(self, response, attempt, retry=True):
+        """Return the number of seconds to wait before retrying the response, or None if it is final."""
+        if response.status_code in RETRY_STATUS_CODES and retry:
+            return self._backoff_delay(attempt)
+        if response.status_code in (403, 429):
+            if 'Retry-After' in response.headers:
+                return float(response.headers['Retry-After'])
+            if response.headers.get('X-RateLimit-Remaining') == '0':
+                return max(0, int(response.headers.get('X-RateLimit-Reset', 0)) - time.time()) + 1
+        return None
+
+    def _update_rate_limit(self, response):
+        """Remember when an exhausted rate limit is reset, so no further requests are wasted."""
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            with self._lock:
+                self._rate_limit_reset = int(response.headers.get('X-RateLimit-Reset', 0))
+
+    def _wait_for_rate_limit(self):
+        delay = self._rate_limit_reset - time.time()
+        if delay > 0:
+            print(f'Rate limit exhausted, waiting {delay:.0f}s for the reset')
+            time.sleep(delay + 1)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the shared client, authenticated with GITHUB_TOKEN from the environment and using the HTTP cache."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GitHubClient(os.getenv('GITHUB_TOKEN'), cache=HttpCache())
+        return _client
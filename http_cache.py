@@ -0,0 +1,159 @@
+import base64
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Location of the HTTP cache, can be overridden with PYGRADER_CACHE_DIR
+DEFAULT_CACHE_DIR = Path(os.getenv('PYGRADER_CACHE_DIR', Path.home() / '.cache' / 'pygrader_helper')) / 'http'
+
+# Size budget of the HTTP cache (200 MB)
+DEFAULT_MAX_BYTES = 200 * 1024 ** 2
+
+# Response headers kept with a cached body
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Link')
+
+
+class HttpCache:
+    """
+    Persistent cache of GET responses for conditional requests.
+
+    Responses are stored with their ETag / Last-Modified, keyed by the full URL (including the query
+    parameters) and the credentials. A later request sends If-None-Match / If-Modified-Since and a
+    304 Not Modified is answered from the cache; GitHub doesn't count 304s against the rate limit.
+    The least recently used entries are evicted when the cache exceeds its size budget.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(url, authorization=None):
+        """Return the cache key for the full URL and the Authorization header."""
+        return hashlib.sha256(f'{authorization or ""} {url}'.encode()).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f'{key}.json'
+
+    def get(self, key):
+        """Return the cached entry or None."""
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def validators(self, entry):
+        """Return the conditional request headers for the cached entry."""
+        headers = {}
+        if entry.get('headers', {}).get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry.get('headers', {}).get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def put(self, key, response):
+        """Store a 200 response if it has a validator."""
+        if response.status_code != 200 or not ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            return
+        entry = {
+            'url': response.url,
+            'stored': time.time(),
+            'headers': {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers},
+            'body': base64.b64encode(response.content).decode('ascii'),
+        }
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(entry, file)
+        new_size = temp_path.stat().st_size
+
+        with self._lock:
+            # An overwritten entry only adds the difference to the size
+            try:
+                old_size = path.stat().st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(temp_path, path)
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += new_size - old_size
+            if self._size > self.max_bytes:
+                self._size = self.evict()
+
+    def response(self, key, entry):
+        """Build a 200 response from the cached entry and mark it as recently used."""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry['url']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = base64.b64decode(entry['body'])
+        response.encoding = 'utf-8'
+        self._path(key).touch()
+        return response
+
+    def entries(self):
+        """Return (last used, size, path) for every cached entry."""
+        entries = []
+        for path in self.cache_dir.glob('*/*.json'):
+            try:
+                stat = path.stat()
+                entries.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                pass
+        return entries
+
+    def size(self):
+        """Return the total size of the cache in bytes."""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, max_bytes=None):
+        """Remove the least recently used entries until the cache fits into max_bytes. Returns the new size."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self.entries())
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total_size <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+        return total_size
+
+    def clear(self):
+        """Remove all entries."""
+        self.evict(0)
+        with self._lock:
+            self._size = 0
+
+
+def inspect(cache):
+    """Print the size of the cache and its most recently used entries."""
+    entries = sorted(cache.entries(), reverse=True)
+    print(f"HTTP cache {cache.cache_dir}: {len(entries)} entries, "
+          f"{sum(size for _, size, _ in entries) // 1024} KB of {cache.max_bytes // 1024} KB")
+    for last_used, size, path in entries[:20]:
+        entry = cache.get(path.stem) or {}
+        print(f"  {time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used))} {size // 1024:>6} KB "
+              f"{entry.get('url')}")
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'inspect'
+    if command == 'clear':
+        HttpCache().clear()
+        print('HTTP cache cleared')
+    elif command == 'inspect':
+        inspect(HttpCache())
+    else:
+        print('Usage: python http_cache.py [inspect|clear]')
@@ -1,52 +1,117 @@
-import requests
+import fnmatch
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import parse_qs, urlparse
+
 from dotenv import load_dotenv
-import os
 
-def get_repos(org_name, keyword):
+from github_client import GitHubError, get_client
+
+# Repositories per page, 100 is the maximum of the GitHub API
+PER_PAGE = 100
+
+# Number of pages fetched at the same time
+DEFAULT_PAGE_WORKERS = 4
+
+
+def matches_filter(repo_name, keyword=None, pattern=None, regex=None):
+    """
+    Checks if a repository name matches all given filters.
+
+    Parameters:
+    repo_name (str): The name of the repository.
+    keyword (str): A substring the name must contain.
+    pattern (str): A glob pattern the name must match, e.g. 'm323-lu0[1-3]-*'.
+    regex (str): A regular expression the name must contain a match for.
+
+    Returns:
+    bool: True if the name matches all filters that are set.
+    """
+    return ((keyword is None or keyword in repo_name)
+            and (pattern is None or fnmatch.fnmatchcase(repo_name, pattern))
+            and (regex is None or re.search(regex, repo_name) is not None))
+
+
+def iter_repos(org_name, keyword=None, pattern=None, regex=None, max_workers=DEFAULT_PAGE_WORKERS, ordered=False):
+    """
+    Yields the names of the repositories in a GitHub organization that match the filters.
+
+    The first page tells how many pages there are (Link: last), the remaining pages are fetched
+    concurrently and their matching names are yielded as soon as a page arrives.
+
+    Parameters:
+    org_name (str): The name of the GitHub organization.
+    keyword, pattern, regex (str): The filters, see matches_filter.
+    max_workers (int): The number of pages fetched at the same time.
+    ordered (bool): Yield the pages in order instead of as they arrive.
+
+    Yields:
+    str: The names of the matching repositories.
+    """
+    client = get_client()
+    path = f'orgs/{org_name}/repos'
+
+    def page_names(page):
+        return [repo['name'] for repo in page if matches_filter(repo['name'], keyword, pattern, regex)]
+
+    first_page = client.get(path, params={'per_page': PER_PAGE})
+    yield from page_names(first_page.json())
+
+    last_url = first_page.links.get('last', {}).get('url')
+    if not last_url:
+        # Without a last link, follow the next links one page at a time
+        next_url = first_page.links.get('next', {}).get('url')
+        if next_url:
+            for page in client.paginate(next_url):
+                yield from page_names(page)
+        return
+
+    last_page = int(parse_qs(urlparse(last_url).query)['page'][0])
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [executor.submit(client.get_json, path, {'per_page': PER_PAGE, 'page': page})
+                   for page in range(2, last_page + 1)]
+        for future in (futures if ordered else as_completed(futures)):
+            yield from page_names(future.result())
+    finally:
+        # Stop fetching if the caller stops early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_repos(org_name, keyword=None, pattern=None, regex=None):
     """
     Fetches a list of repositories from a GitHub organization that match a specific keyword.
 
     Parameters:
     org_name (str): The name of the GitHub organization.
     keyword (str): The keyword to filter repositories.
+    pattern (str): Optional glob pattern to filter repositories.
+    regex (str): Optional regular expression to filter repositories.
 
     Returns:
     list: A list of repository names that match the keyword.
+
+    Raises:
+    GitHubError: If a page can't be fetched, instead of returning a partial list.
     """
-    url = f'https://api.github.com/orgs/{org_name}/repos'
-    github_token = os.environ['GITHUB_TOKEN']
-
-    headers = {
-        'Authorization': f'token {github_token}'
-    }
-    repos = []
-    params = {
-        'per_page': 100
-    }
-
-    while url:
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            filtered_repos = [repo['name'] for repo in data if keyword in repo['name']]
-            repos.extend(filtered_repos)
-            url = response.links.get('next', {}).get('url')
-        else:
-            print(f'Failed to fetch repositories: {response.status_code}')
-            break
-
-    return repos
+    return list(iter_repos(org_name, keyword, pattern, regex, ordered=True))
 
 
 if __name__ == '__main__':
     load_dotenv()
     org_name = 'templates-python'
     keyword = ('323')
-    repos = get_repos(org_name, keyword)
-
-    if repos:
-        print('Found repositories:')
-        for repo in repos:
+    pattern = None  # e.g. 'm323-lu0*'
+    regex = None  # e.g. r'-a0[1-5]-'
+    found = 0
+    try:
+        for repo in iter_repos(org_name, keyword, pattern, regex):
+            if not found:
+                print('Found repositories:')
+            found += 1
             print(f"\"{repo}\",")
-    else:
+    except GitHubError as e:
+        print(f'Failed to fetch repositories: {e}')
+
+    if not found:
         print('No repositories found')
\ No newline at end of file
@@ -0,0 +1,133 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from command_runner import run_command
+from git_utils import get_repo_url
+
+# Location of the mirror cache, can be overridden with PYGRADER_CACHE_DIR
+DEFAULT_CACHE_DIR = Path(os.getenv('PYGRADER_CACHE_DIR', Path.home() / '.cache' / 'pygrader_helper')) / 'mirrors'
+
+# Disk budget of the mirror cache (5 GB)
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+
+# File inside each mirror whose mtime records when the mirror was last used
+LAST_USED_FILE = 'pygrader-last-used'
+
+
+class MirrorCache:
+    """
+    On-disk cache of bare mirrors keyed by organization and repository.
+
+    The first use of a repository clones a bare mirror, later uses only fetch the new objects.
+    Working copies are created from the mirror, so the objects are never downloaded twice.
+    The least recently used mirrors are evicted when the cache exceeds its disk budget.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def mirror_path(self, org_name, repo_name):
+        """Return the path of the mirror for the repository."""
+        return self.cache_dir / org_name / f'{repo_name}.git'
+
+    def _lock(self, mirror_path):
+        with self._locks_lock:
+            return self._locks.setdefault(mirror_path, threading.Lock())
+
+    def update_mirror(self, org_name, repo_name, github_token):
+        """
+        Create or incrementally update the mirror of the repository and return its path.
+
+        The token is only passed on the command line, it is never stored in the mirror.
+        """
+        mirror_path = self.mirror_path(org_name, repo_name)
+        repo_url = get_repo_url(org_name, repo_name, github_token)
+
+        with self._lock(mirror_path):
+            if not (mirror_path / 'HEAD').exists():
+                mirror_path.parent.mkdir(parents=True, exist_ok=True)
+                run_command(["git", "init", "--bare", "--quiet", str(mirror_path)], check=True)
+                # Working copies borrow objects from the mirror, so git must never prune them on its own
+                run_command(["git", "config", "gc.auto", "0"], cwd=mirror_path, check=True)
+
+                self._set_default_branch(mirror_path, repo_url)
+
+            result = run_command(
+                ["git", "fetch", "--prune", "--quiet", repo_url,
+                 "+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*"],
+                cwd=mirror_path
+            )
+            # Don't use check=True, the error message would contain the token
+            if result.returncode != 0:
+                raise RuntimeError(f"Fetching {org_name}/{repo_name} into the mirror cache failed.")
+            (mirror_path / LAST_USED_FILE).touch()
+        return mirror_path
+
+    @staticmethod
+    def _set_default_branch(mirror_path, repo_url):
+        """Point HEAD of the mirror to the default branch of the remote repository."""
+        result = run_command(["git", "ls-remote", "--symref", repo_url, "HEAD"],
+                             cwd=mirror_path, capture_output=True, text=True)
+        for line in result.stdout.splitlines():
+            if line.startswith('ref: '):
+                default_ref = line[5:].split('\t')[0]
+                run_command(["git", "symbolic-ref", "HEAD", default_ref], cwd=mirror_path)
+                return
+
+    def clone(self, org_name, repo_name, github_token, cwd=None, no_checkout=False, bare=False):
+        """
+        Create a working copy of the repository from its mirror and return its path.
+
+        The working copy shares the objects of the mirror (git clone --shared) and its
+        origin points to GitHub, so pushing works as with a normal clone.
+        """
+        mirror_path = self.update_mirror(org_name, repo_name, github_token)
+        repo_path = os.path.join(cwd or os.getcwd(), repo_name)
+        repo_url = get_repo_url(org_name, repo_name, github_token)
+
+        args = ["git", "clone", "--shared", "--quiet"]
+        if bare:
+            args.append("--bare")
+        elif no_checkout:
+            args.append("--no-checkout")
+        run_command(args + [str(mirror_path), repo_path], check=True)
+        run_command(["git", "remote", "set-url", "origin", repo_url], cwd=repo_path, check=True)
+        return repo_path
+
+    def evict(self):
+        """
+        Remove the least recently used mirrors until the cache fits into its disk budget.
+
+        Working copies borrow the objects of their mirror, so only call this when no working copy is in use.
+        """
+        mirrors = []
+        for mirror_path in self.cache_dir.glob('*/*.git'):
+            last_used_file = mirror_path / LAST_USED_FILE
+            last_used = last_used_file.stat().st_mtime if last_used_file.exists() else 0
+            mirrors.append((last_used, directory_size(mirror_path), mirror_path))
+
+        total_size = sum(size for _, size, _ in mirrors)
+        for _, size, mirror_path in sorted(mirrors):
+            if total_size <= self.max_bytes:
+                break
+            with self._lock(mirror_path):
+                shutil.rmtree(mirror_path, ignore_errors=True)
+            total_size -= size
+            print(f"Evicted mirror {mirror_path} ({size // 1024} KB)")
+
+
+def directory_size(path):
+    """Return the total size of all files below path in bytes."""
+    return sum(file.stat().st_size for file in Path(path).rglob('*') if file.is_file())
+
+
+if __name__ == '__main__':
+    cache = MirrorCache()
+    cache.evict()
+    print(f"Mirror cache {cache.cache_dir}: {directory_size(cache.cache_dir) // 1024 ** 2} MB "
+          f"of {cache.max_bytes // 1024 ** 2} MB")
@@ -1,48 +1,95 @@
+import argparse
 import os
-import json
-import shutil
-import tkinter as tk
-from tkinter import filedialog
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from batch_converter_old_to_new import UNCONVERTED_LAYOUTS, convert_project, project_layout
+
+# Directory containing the templates, next to this script
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates_for_repo_converter'
+
+# Number of pylint errors allowed by the generated lint.json
+MAX_ERRORS = 20
+
+# Folders that are never searched for projects
+SKIPPED_FOLDERS = {'__pycache__', 'node_modules', 'venv'}
 
 
 def select_project_folder():
     """Open a dialog to select the project folder."""
+    # Imported here so the headless mode also works without tkinter
+    import tkinter as tk
+    from tkinter import filedialog
+
     root = tk.Tk()
     root.withdraw()  # Hide the root window
     folder_selected = filedialog.askdirectory()
     return folder_selected
 
 
-def read_json(file_path):
-    """Read JSON file and return its content."""
-    with open(file_path, 'r') as file:
-        return json.load(file)
-
-
-def write_json(file_path, content):
-    """Write content to a JSON file."""
-    with open(file_path, 'w') as file:
-        json.dump(content, file, indent=2)
-
-
-def convert_autograding(json_content):
-    """Convert autograding.json format to unittests.json format."""
-    tests = json_content['tests']
-    new_tests = [{'name': test['name'], 'function': test['name'], 'timeout': test['timeout'], 'points': test['points']}
-                 for test in tests]
-    return new_tests
-
-
-def list_root_python_files(folder_path):
-    """List all Python files in the root folder that do not contain pytest."""
-    python_files = []
-    for file in os.listdir(folder_path):
-        if file.endswith('.py') and 'test_' not in file and '_test' not in file:
-            python_files.append(file)
-    return python_files
+def find_old_projects(root_folder):
+    """
+    Return the project folders below root_folder that still have the old .github/classroom layout.
+    The folders inside a project and hidden folders like .git are not searched.
+    """
+    projects = []
+    for folder, subfolders, _ in os.walk(root_folder):
+        if project_layout(folder) in UNCONVERTED_LAYOUTS:
+            projects.append(folder)
+            subfolders.clear()
+            continue
+        subfolders[:] = sorted(name for name in subfolders
+                               if not name.startswith('.') and name not in SKIPPED_FOLDERS)
+    return projects
+
+
+def convert_folder(project_folder):
+    """Convert one project folder; returns (project_folder, converted, error message)."""
+    try:
+        return project_folder, convert_project(project_folder, TEMPLATE_DIR, max_errors=MAX_ERRORS), None
+    except Exception as e:
+        return project_folder, False, f"{type(e).__name__}: {e}"
+
+
+def convert_all(root_folder, max_workers=None):
+    """
+    Convert all projects with the old layout below root_folder in parallel and print a summary.
+
+    Returns:
+    list: (project_folder, converted, error message) for each project found.
+    """
+    start = time.perf_counter()
+    projects = find_old_projects(root_folder)
+    if not projects:
+        print(f"No projects with the old layout found in {root_folder}")
+        return []
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(convert_folder, projects))
+
+    converted = [folder for folder, changed, error in results if changed]
+    failed = [(folder, error) for folder, changed, error in results if error]
+    for folder, error in failed:
+        print(f"Failed: {os.path.relpath(folder, root_folder)}: {error}")
+    print(f"Converted {len(converted)} of {len(projects)} projects in {root_folder} "
+          f"in {time.perf_counter() - start:.1f}s, {len(failed)} failed")
+    return results
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        description='Convert projects from the old pygrader format (2023) to the new format (2024).')
+    parser.add_argument('--root', help='convert every project with the old layout below this folder, '
+                                       'without a GUI (default: select a single project folder)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of projects converted at the same time (default: number of CPUs)')
+    args = parser.parse_args()
+
+    if args.root:
+        convert_all(args.root, args.workers)
+        return
+
     # Select the project folder
     project_folder = select_project_folder()
 
@@ -50,52 +97,8 @@ def main():
         print('No folder selected. Exiting...')
         return
 
-    # Paths
-    github_folder = os.path.join(project_folder, '.github')
-    classroom_folder = os.path.join(github_folder, 'classroom')
-    autograding_folder = os.path.join(github_folder, 'autograding')
-
-    autograding_json_path = os.path.join(classroom_folder, 'autograding.json')
-    unittests_json_path = os.path.join(autograding_folder, 'unittests.json')
-    lint_json_path = os.path.join(autograding_folder, 'lint.json')
-    pylintrc_path = os.path.join(os.getcwd(), 'templates_for_repo_converter/pylintrc')
-    dest_pylintrc_path = os.path.join(autograding_folder, 'pylintrc')
-
-    workflows_folder = os.path.join(github_folder, 'workflows')
-    classroom_yml_path = os.path.join(os.getcwd(), 'templates_for_repo_converter/classroom.yml')
-    dest_classroom_yml_path = os.path.join(workflows_folder, 'classroom.yml')
-    copyissues_yml_path = os.path.join(os.getcwd(), 'templates_for_repo_converter/copyissues.yml')
-    dest_copyissues_yml_path = os.path.join(workflows_folder, 'copyissues.yml')
-
-    # Create necessary folders
-    os.makedirs(autograding_folder, exist_ok=True)
-    os.makedirs(workflows_folder, exist_ok=True)
-
-    # Convert autograding.json to unittests.json
-    autograding_content = read_json(autograding_json_path)
-    unittests_content = convert_autograding(autograding_content)
-    write_json(unittests_json_path, unittests_content)
-
-    # Create lint.json
-    python_files = list_root_python_files(project_folder)
-    lint_content = {'files': python_files, 'ignore': [], 'max': 20}
-    write_json(lint_json_path, lint_content)
-
-    # Copy pylintrc
-    if os.path.exists(pylintrc_path):
-        shutil.copy(pylintrc_path, dest_pylintrc_path)
-
-    # Copy classroom.yml and copyissues.yml
-    if os.path.exists(classroom_yml_path):
-        shutil.copy(classroom_yml_path, dest_classroom_yml_path)
-    if os.path.exists(copyissues_yml_path):
-        shutil.copy(copyissues_yml_path, dest_copyissues_yml_path)
-
-    # Remove classroom folder
-    if os.path.exists(classroom_folder):
-        shutil.rmtree(classroom_folder)
-
-    print('Operation completed successfully.')
+    if convert_project(project_folder, TEMPLATE_DIR, max_errors=MAX_ERRORS):
+        print('Operation completed successfully.')
 
 
 if __name__ == '__main__':
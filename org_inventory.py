@@ -0,0 +1,213 @@
+import json
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+
+from github_client import GitHubError, get_client
+
+# Repositories per GraphQL request, 100 is the maximum page size of the GitHub API
+BATCH_SIZE = 100
+
+
+@dataclass
+class RepoInventory:
+    """
+    What the batch scripts need to know about a repository, without cloning it.
+
+    heads maps each requested branch to its head commit and trees to the tree of that commit,
+    both are None if the branch doesn't exist. fields holds the additionally selected fields.
+    """
+    name: str
+    default_branch: str = None
+    heads: dict = field(default_factory=dict)
+    trees: dict = field(default_factory=dict)
+    fields: dict = field(default_factory=dict)
+
+    def existing_branches(self, branches):
+        """Return the branches that exist in the repository, in the given order."""
+        return [branch for branch in branches if self.heads.get(branch)]
+
+
+def repository_selection(branches, fields=()):
+    """
+    Return the GraphQL selection of a repository: its name, default branch, the extra fields
+    (e.g. 'pushedAt', 'isArchived' or 'diskUsage') and the head commit and tree of each branch.
+    """
+    refs = ' '.join(
+        f'b{index}: ref(qualifiedName: {json.dumps(f"refs/heads/{branch}")}) '
+        f'{{ target {{ oid ... on Commit {{ tree {{ oid }} }} }} }}'
+        for index, branch in enumerate(branches)
+    )
+    return f"name defaultBranchRef {{ name }} {' '.join(fields)} {refs}"
+
+
+def parse_repository(node, branches, fields=()):
+    """Convert a repository node of the GraphQL response into a RepoInventory."""
+    inventory = RepoInventory(node['name'], (node.get('defaultBranchRef') or {}).get('name'))
+    for index, branch in enumerate(branches):
+        target = (node.get(f'b{index}') or {}).get('target') or {}
+        inventory.heads[branch] = target.get('oid')
+        inventory.trees[branch] = (target.get('tree') or {}).get('oid')
+    inventory.fields = {name: node.get(name) for name in fields}
+    return inventory
+
+
+def fetch_org_inventory(org_name, branches=(), fields=(), client=None):
+    """
+    Fetch the inventory of all repositories of an organization, 100 repositories per request.
+
+    Parameters:
+    org_name (str): The name of the GitHub organization.
+    branches (list): The branches whose head commits are looked up, e.g. ['main', 'solution'].
+    fields (list): Additional repository fields to fetch, e.g. ['pushedAt', 'isArchived'].
+
+    Returns:
+    dict: Maps the repository names to their RepoInventory.
+    """
+    client = client or get_client()
+    query = f"""
+        query($org: String!, $cursor: String) {{
+          organization(login: $org) {{
+            repositories(first: {BATCH_SIZE}, after: $cursor) {{
+              pageInfo {{ hasNextPage endCursor }}
+              nodes {{ {repository_selection(branches, fields)} }}
+            }}
+          }}
+        }}"""
+
+    inventory = {}
+    cursor = None
+    while True:
+        data = client.graphql(query, {'org': org_name, 'cursor': cursor})
+        if data.get('organization') is None:
+            raise GitHubError(f"Organization {org_name} not found")
+        repositories = data['organization']['repositories']
+        for node in repositories['nodes']:
+            inventory[node['name']] = parse_repository(node, branches, fields)
+        if not repositories['pageInfo']['hasNextPage']:
+            return inventory
+        cursor = repositories['pageInfo']['endCursor']
+
+
+def fetch_repos_inventory(org_name, repo_names, branches=(), fields=(), client=None):
+    """
+    Fetch the inventory of the listed repositories, looking up to 100 repositories per request.
+
+    Returns:
+    dict: Maps each repository name to its RepoInventory, or to None if the repository doesn't exist.
+    """
+    client = client or get_client()
+    selection = repository_selection(branches, fields)
+    inventory = {}
+    for start in range(0, len(repo_names), BATCH_SIZE):
+        batch = repo_names[start:start + BATCH_SIZE]
+        aliases = ' '.join(
+            f'r{index}: repository(owner: {json.dumps(org_name)}, name: {json.dumps(repo_name)}) {{ {selection} }}'
+            for index, repo_name in enumerate(batch)
+        )
+        data = client.graphql(f'query {{ {aliases} }}')
+        for index, repo_name in enumerate(batch):
+            node = data.get(f'r{index}')
+            inventory[repo_name] = parse_repository(node, branches, fields) if node else None
+    return inventory
+
+
+def fetch_file_texts(org_name, repo_names, branches, path, client=None):
+    """
+    Fetch the content of one file on each branch of the listed repositories, 100 repositories per request,
+    e.g. all requirements.txt files of an organization without cloning anything.
+
+    Returns:
+    dict: Maps (repository, branch) to (blob, text), or to None if the repository, branch or file doesn't exist.
+    """
+    client = client or get_client()
+    files = {}
+    for start in range(0, len(repo_names), BATCH_SIZE):
+        batch = repo_names[start:start + BATCH_SIZE]
+        objects = ' '.join(
+            f'b{index}: object(expression: {json.dumps(f"{branch}:{path}")}) {{ ... on Blob {{ oid text }} }}'
+            for index, branch in enumerate(branches)
+        )
+        aliases = ' '.join(
+            f'r{index}: repository(owner: {json.dumps(org_name)}, name: {json.dumps(repo_name)}) {{ {objects} }}'
+            for index, repo_name in enumerate(batch)
+        )
+        data = client.graphql(f'query {{ {aliases} }}')
+        for index, repo_name in enumerate(batch):
+            node = data.get(f'r{index}') or {}
+            for branch_index, branch in enumerate(branches):
+                blob = node.get(f'b{branch_index}')
+                files[(repo_name, branch)] = (blob['oid'], blob.get('text')) if blob and 'oid' in blob else None
+    return files
+
+
+def fetch_object_ids(org_name, repo_names, branches, paths, client=None):
+    """
+    Look up which paths exist on each branch of the listed repositories, 100 repositories per request.
+    The path '' stands for the root folder, so it tells whether the branch exists at all.
+
+    Returns:
+    dict: Maps (repository, branch) to a dict mapping each path to its object, or None if it doesn't exist.
+    """
+    client = client or get_client()
+    objects = ' '.join(
+        f'b{index}p{path_index}: object(expression: {json.dumps(f"{branch}:{path}")}) {{ oid }}'
+        for index, branch in enumerate(branches) for path_index, path in enumerate(paths)
+    )
+    object_ids = {}
+    for start in range(0, len(repo_names), BATCH_SIZE):
+        batch = repo_names[start:start + BATCH_SIZE]
+        aliases = ' '.join(
+            f'r{index}: repository(owner: {json.dumps(org_name)}, name: {json.dumps(repo_name)}) {{ {objects} }}'
+            for index, repo_name in enumerate(batch)
+        )
+        data = client.graphql(f'query {{ {aliases} }}')
+        for index, repo_name in enumerate(batch):
+            node = data.get(f'r{index}') or {}
+            for branch_index, branch in enumerate(branches):
+                object_ids[(repo_name, branch)] = {
+                    path: (node.get(f'b{branch_index}p{path_index}') or {}).get('oid')
+                    for path_index, path in enumerate(paths)
+                }
+    return object_ids
+
+
+def select_branches(org_name, repo_names, branches, client=None):
+    """
+    Decide which branches of which repositories need to be processed, without cloning them.
+    Repositories and branches that don't exist are skipped with a message.
+
+    Returns:
+    dict: Maps the repository names to their existing branches, or None if the inventory can't be fetched.
+    """
+    try:
+        inventory = fetch_repos_inventory(org_name, list(repo_names), branches, client=client)
+    except GitHubError as e:
+        print(f"Repository inventory unavailable, processing all repositories: {e}")
+        return None
+
+    selected = {}
+    for repo_name, repo in inventory.items():
+        if repo is None:
+            print(f"Repository {org_name}/{repo_name} does not exist. Skipped.")
+            continue
+        existing = repo.existing_branches(branches)
+        missing = [branch for branch in branches if branch not in existing]
+        if missing:
+            print(f"Branch {', '.join(missing)} does not exist in {org_name}/{repo_name}. Skipped.")
+        if existing:
+            selected[repo_name] = existing
+    return selected
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    org_name = 'templates-python'
+    branches = ['main', 'solution']
+    fields = ['pushedAt', 'isArchived']
+    try:
+        for repo in fetch_org_inventory(org_name, branches, fields).values():
+            heads = ', '.join(f"{branch}={(oid or '-')[:7]}" for branch, oid in repo.heads.items())
+            print(f"{repo.name} [{repo.default_branch}] {heads} {repo.fields}")
+    except GitHubError as e:
+        print(f'Failed to fetch the inventory: {e}')
@@ -0,0 +1,275 @@
+import os
+import shutil
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any
+
+from command_runner import timed, trace_context
+from git_utils import (FULL_CLONE, RepoTransaction, add_alternate, branch_worktrees, clone_repo, commit_entries,
+                       commit_overlay, ls_tree, resolve_branch)
+from github_client import GitHubError
+from org_inventory import select_branches
+
+# Default number of repositories processed at the same time
+DEFAULT_MAX_WORKERS = 4
+
+
+@dataclass
+class RepoResult:
+    """The outcome of processing a single repository."""
+    repo_name: str
+    ok: bool
+    result: Any = None
+    error: str = None
+
+
+def run_repos(repo_names, process_repo, max_workers=DEFAULT_MAX_WORKERS, workdir=True):
+    """
+    Run process_repo for every repository in parallel.
+
+    Each repository gets its own temporary working directory, so workers never depend
+    on the current directory of the process. The directory is removed afterwards.
+
+    Args:
+        repo_names (iterable): The names of the repositories to process. It is only iterated once, so a
+            generator like list_all_repos_in_org_with_filter.iter_repos can still be listing the organization
+            while the first repositories are processed.
+        process_repo (callable): Called as process_repo(repo_name, workdir); its return value is collected.
+        max_workers (int): The number of repositories processed at the same time.
+        workdir (bool): Without a working directory process_repo gets None, e.g. when nothing is cloned.
+
+    Returns:
+        list: One RepoResult per repository, in the order of repo_names.
+    """
+    def worker(repo_name):
+        repo_workdir = tempfile.mkdtemp(prefix=f'{repo_name}-') if workdir else None
+        try:
+            with trace_context(repo=repo_name), timed('repo'):
+                return RepoResult(repo_name, True, result=process_repo(repo_name, repo_workdir))
+        except Exception as e:
+            print(f"Error processing {repo_name}: {e}")
+            return RepoResult(repo_name, False, error=traceback.format_exc())
+        finally:
+            if repo_workdir:
+                shutil.rmtree(repo_workdir, ignore_errors=True)
+
+    results = {}
+    submitted = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {}
+        for repo_name in repo_names:
+            submitted.append(repo_name)
+            futures[executor.submit(worker, repo_name)] = repo_name
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return [results[repo_name] for repo_name in submitted]
+
+
+def process_repo_branches(org_name, repo_name, github_token, workdir, branches, edit_branch, commit_message,
+                          cache=None, profile=FULL_CLONE, sparse_paths=None):
+    """
+    Clone a repository into workdir, edit each branch and commit and push the changes.
+
+    Every branch is checked out into its own worktree of the same clone,
+    so the branches are edited and committed at the same time. The commits
+    of all branches are pushed with a single atomic push at the end.
+
+    Args:
+        edit_branch (callable): Called as edit_branch(repo_path, branch); a falsy return value skips the commit.
+        commit_message (callable): Called as commit_message(branch); returns the commit message.
+        cache (MirrorCache): Optional mirror cache the working copy is created from.
+        profile (CloneProfile): Selects a shallow, partial and/or sparse clone.
+        sparse_paths (list): The paths edit_branch reads or writes, checked out by a sparse profile.
+
+    Returns:
+        dict: Maps the processed branches to their head commits after the push.
+    """
+    repo_path = clone_repo(org_name, repo_name, github_token, cwd=workdir, cache=cache, profile=profile,
+                           branches=branches, no_checkout=True)
+    if not os.path.isdir(repo_path):
+        raise RuntimeError(f"Repository {org_name}/{repo_name} was not cloned successfully.")
+
+    transaction = RepoTransaction(repo_path)
+
+    def process_branch(branch, worktree_path):
+        with trace_context(repo=repo_name, branch=branch):
+            with timed('edit'):
+                changed = edit_branch(worktree_path, branch)
+            if changed:
+                transaction.commit(branch, commit_message(branch), cwd=worktree_path)
+
+    with branch_worktrees(repo_path, branches, sparse_paths if profile.sparse else None) as worktrees:
+        with ThreadPoolExecutor(max_workers=max(1, len(worktrees))) as executor:
+            futures = [executor.submit(process_branch, branch, path) for branch, path in worktrees.items()]
+            for future in futures:
+                future.result()
+
+    # Push all branches of the repository at once
+    if not transaction.push():
+        raise RuntimeError(f"Pushing to {org_name}/{repo_name} failed.")
+    return {branch: resolve_branch(repo_path, branch) for branch in worktrees}
+
+
+def process_repo_overlay(org_name, repo_name, github_token, workdir, branches, overlay, commit_message,
+                         paths_to_remove=None, cache=None, profile=FULL_CLONE):
+    """
+    Commit the overlay files onto each branch of a bare clone and push the changes.
+
+    No branch is ever checked out, so the cost per branch depends on the number of changed files only.
+    Returns a dict mapping the existing branches to their head commits after the push.
+    """
+    repo_path = clone_repo(org_name, repo_name, github_token, cwd=workdir, cache=cache, profile=profile,
+                           branches=branches, bare=True)
+    if not os.path.isdir(repo_path):
+        raise RuntimeError(f"Repository {org_name}/{repo_name} was not cloned successfully.")
+
+    transaction = RepoTransaction(repo_path)
+    for branch in branches:
+        with trace_context(branch=branch):
+            if commit_overlay(repo_path, branch, overlay, commit_message(branch), paths_to_remove):
+                transaction.add(branch)
+
+    if not transaction.push():
+        raise RuntimeError(f"Pushing to {org_name}/{repo_name} failed.")
+    heads = {branch: resolve_branch(repo_path, branch) for branch in branches}
+    return {branch: head for branch, head in heads.items() if head}
+
+
+def process_repo_manifests(org_name, repo_name, github_token, workdir, source_path, manifests, commit_message,
+                           cache=None, profile=FULL_CLONE):
+    """
+    Bring the files of a source repository (e.g. a template clone) onto the branches of a bare clone and push them.
+
+    The blobs are read from the local source clone, so nothing is copied or hashed again. Only the
+    branches where a file of the manifest is missing or different get a commit, files that only
+    exist in the repository are kept.
+
+    Args:
+        source_path (str): The local clone the manifests were listed from.
+        manifests (dict): Maps each branch to the files to sync, as returned by ls_tree.
+
+    Returns:
+        dict: Maps the existing branches to their head commits after the push.
+    """
+    repo_path = clone_repo(org_name, repo_name, github_token, cwd=workdir, cache=cache, profile=profile,
+                           branches=list(manifests), bare=True)
+    if not os.path.isdir(repo_path):
+        raise RuntimeError(f"Repository {org_name}/{repo_name} was not cloned successfully.")
+    add_alternate(repo_path, source_path)
+
+    transaction = RepoTransaction(repo_path)
+    heads = {}
+    for branch, manifest in manifests.items():
+        with trace_context(branch=branch):
+            head = resolve_branch(repo_path, branch)
+            if head is None:
+                print(f"Branch {branch} does not exist in {org_name}/{repo_name}. Skipped.")
+                continue
+            current = ls_tree(repo_path, head)
+            entries = {path: entry for path, entry in manifest.items() if current.get(path) != entry}
+            if entries and commit_entries(repo_path, branch, entries, commit_message(branch)):
+                transaction.add(branch)
+            heads[branch] = resolve_branch(repo_path, branch)
+
+    if not transaction.push():
+        raise RuntimeError(f"Pushing to {org_name}/{repo_name} failed.")
+    return heads
+
+
+def branch_lists(repo_names, branches):
+    """
+    Return all branches and a dict mapping each repository to its branches.
+    branches is either one list for all repositories or a dict mapping each repository to its own list.
+    """
+    if isinstance(branches, dict):
+        all_branches = list(dict.fromkeys(branch for names in branches.values() for branch in names))
+        return all_branches, {repo_name: list(branches.get(repo_name, [])) for repo_name in repo_names}
+    return list(branches), {repo_name: list(branches) for repo_name in repo_names}
+
+
+def select_targets(org_name, repo_names, branches, skip_missing=True, index=None, operation=None):
+    """
+    Return the repositories to process and a dict mapping each of them to its branches.
+    branches is a list or a dict mapping each repository to its own branches (see branch_lists).
+    With skip_missing the repositories and branches that don't exist are dropped up front
+    with a few GraphQL requests, instead of finding out with one clone per repository.
+    With a RepoIndex and an operation key only the branches that moved since the operation
+    was last applied are selected.
+    """
+    branches, requested = branch_lists(repo_names, branches)
+    repo_names = [repo_name for repo_name in repo_names if requested[repo_name]]
+    targets = None
+    if index is not None and operation:
+        try:
+            index.refresh(org_name, repo_names, branches)
+            targets = index.select_changed(org_name, repo_names, branches, operation)
+            print(f"{len(targets)} of {len(repo_names)} repositories changed since {operation} was last applied")
+        except GitHubError as e:
+            print(f"Repository index could not be refreshed, processing all repositories: {e}")
+    elif skip_missing:
+        targets = select_branches(org_name, repo_names, branches)
+    if targets is None:
+        return list(repo_names), requested
+    targets = {repo_name: [branch for branch in targets[repo_name] if branch in requested[repo_name]]
+               for repo_name in repo_names if repo_name in targets}
+    return [repo_name for repo_name in repo_names if targets.get(repo_name)], targets
+
+
+def record_results(org_name, results, index=None, operation=None):
+    """Record the heads the successfully processed repositories were left at in the index."""
+    if index is None or not operation:
+        return
+    for result in results:
+        if result.ok and result.result:
+            index.record_applied(org_name, result.repo_name, result.result, operation)
+
+
+def run_overlay_batch(org_name, repo_names, branches, github_token, overlay, commit_message, paths_to_remove=None,
+                      max_workers=DEFAULT_MAX_WORKERS, cache=None, profile=FULL_CLONE, skip_missing=True,
+                      index=None, operation=None):
+    """Commit the overlay files onto a list of repositories in parallel without checkouts and print a summary."""
+    repo_names, targets = select_targets(org_name, repo_names, branches, skip_missing, index, operation)
+
+    def process_repo(repo_name, workdir):
+        return process_repo_overlay(org_name, repo_name, github_token, workdir, targets[repo_name], overlay,
+                                    commit_message, paths_to_remove, cache, profile)
+
+    results = run_repos(repo_names, process_repo, max_workers)
+    record_results(org_name, results, index, operation)
+    if cache is not None:
+        cache.evict()
+    print_results(org_name, results)
+    return results
+
+
+def run_batch(org_name, repo_names, branches, github_token, edit_branch, commit_message,
+              max_workers=DEFAULT_MAX_WORKERS, cache=None, profile=FULL_CLONE, sparse_paths=None, skip_missing=True,
+              index=None, operation=None):
+    """
+    Clone, edit, commit and push a list of repositories in parallel and print a summary.
+    With a MirrorCache the mirrors are kept for the next run and the cache is evicted down to its budget.
+    With skip_missing repositories and branches that don't exist are skipped without cloning (see select_targets).
+    With a RepoIndex and an operation key only the branches that changed since the last successful run are processed.
+    """
+    repo_names, targets = select_targets(org_name, repo_names, branches, skip_missing, index, operation)
+
+    def process_repo(repo_name, workdir):
+        return process_repo_branches(org_name, repo_name, github_token, workdir, targets[repo_name],
+                                     edit_branch, commit_message, cache, profile, sparse_paths)
+
+    results = run_repos(repo_names, process_repo, max_workers)
+    record_results(org_name, results, index, operation)
+    if cache is not None:
+        cache.evict()
+    print_results(org_name, results)
+    return results
+
+
+def print_results(org_name, results):
+    """Print a summary of the processed repositories and the failures."""
+    failed = [result for result in results if not result.ok]
+    print(f"Processed {len(results) - len(failed)} of {len(results)} repositories successfully in {org_name}")
+    for result in failed:
+        print(f"Failed: {result.repo_name}: {result.error.strip().splitlines()[-1]}")
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from org_inventory import fetch_org_inventory, fetch_repos_inventory
+
+# Location of the index, can be overridden with PYGRADER_CACHE_DIR
+DEFAULT_INDEX_PATH = Path(os.getenv('PYGRADER_CACHE_DIR', Path.home() / '.cache' / 'pygrader_helper')) / 'repo_index.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    org TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    default_branch TEXT,
+    refreshed REAL NOT NULL,
+    PRIMARY KEY (org, repo)
+);
+CREATE TABLE IF NOT EXISTS branches (
+    org TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    head TEXT NOT NULL,
+    tree TEXT,
+    PRIMARY KEY (org, repo, branch)
+);
+CREATE TABLE IF NOT EXISTS applied (
+    org TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    head TEXT NOT NULL,
+    applied REAL NOT NULL,
+    PRIMARY KEY (org, repo, branch, operation)
+);
+"""
+
+
+def fingerprint(value):
+    """
+    Return a hash of an operation parameter. Files and directories are hashed by their content,
+    so editing a template file changes the operation and the repositories are processed again.
+    """
+    digest = hashlib.sha256()
+    if isinstance(value, Path) and value.is_dir():
+        for item in sorted(value.rglob('*')):
+            if item.is_file():
+                digest.update(item.relative_to(value).as_posix().encode() + b'\0' + item.read_bytes() + b'\0')
+    elif isinstance(value, Path) and value.is_file():
+        digest.update(value.read_bytes())
+    else:
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def operation_key(name, *parameters):
+    """Return the key of a batch operation, e.g. operation_key('file_manager', template_dir, files_to_remove)."""
+    return f"{name}:{fingerprint([fingerprint(parameter) for parameter in parameters])[:16]}"
+
+
+class RepoIndex:
+    """
+    Local SQLite index of the repositories of the organizations.
+
+    It stores the head commit of each branch, refreshed from the API, and the head each batch operation
+    left behind after its last successful run. A batch run only has to process the branches that moved
+    since then, or the branches the operation was never applied to.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # The workers of a batch run record their results through the same connection
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def refresh(self, org_name, repo_names=None, branches=('main', 'solution')):
+        """
+        Update the branch heads of the listed repositories (or all repositories of the organization) from the API.
+        Repositories that don't exist anymore are removed from the index.
+        """
+        if repo_names is None:
+            inventory = fetch_org_inventory(org_name, branches)
+            with self._lock, self._connection:
+                self._connection.execute("DELETE FROM repos WHERE org = ?", (org_name,))
+                self._connection.execute("DELETE FROM branches WHERE org = ?", (org_name,))
+        else:
+            inventory = fetch_repos_inventory(org_name, list(repo_names), branches)
+
+        now = time.time()
+        with self._lock, self._connection:
+            for repo_name, repo in inventory.items():
+                self._connection.execute("DELETE FROM branches WHERE org = ? AND repo = ? AND branch IN (%s)"
+                                         % ','.join('?' * len(branches)), (org_name, repo_name, *branches))
+                if repo is None:
+                    self._connection.execute("DELETE FROM repos WHERE org = ? AND repo = ?", (org_name, repo_name))
+                    continue
+                self._connection.execute("INSERT OR REPLACE INTO repos VALUES (?, ?, ?, ?)",
+                                         (org_name, repo_name, repo.default_branch, now))
+                self._connection.executemany(
+                    "INSERT INTO branches VALUES (?, ?, ?, ?, ?)",
+                    [(org_name, repo_name, branch, head, repo.trees.get(branch))
+                     for branch, head in repo.heads.items() if head]
+                )
+        return inventory
+
+    def repos(self, org_name):
+        """Return the names of the indexed repositories of the organization."""
+        with self._lock:
+            rows = self._connection.execute("SELECT repo FROM repos WHERE org = ? ORDER BY repo", (org_name,))
+            return [repo_name for repo_name, in rows]
+
+    def heads(self, org_name, repo_name):
+        """Return a dict mapping the indexed branches of the repository to their head commits."""
+        with self._lock:
+            rows = self._connection.execute("SELECT branch, head FROM branches WHERE org = ? AND repo = ?",
+                                            (org_name, repo_name))
+            return dict(rows)
+
+    def select_changed(self, org_name, repo_names, branches, operation):
+        """
+        Return a dict mapping each repository that needs the operation to the branches that need it:
+        the branches whose head moved since the operation was last applied, or that never got it.
+        Repositories and branches missing from the index are left out.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT b.repo, b.branch FROM branches b LEFT JOIN applied a "
+                "ON a.org = b.org AND a.repo = b.repo AND a.branch = b.branch AND a.operation = ? "
+                "WHERE b.org = ? AND (a.head IS NULL OR a.head != b.head)",
+                (operation, org_name)
+            ).fetchall()
+
+        changed = {}
+        for repo_name, branch in rows:
+            changed.setdefault(repo_name, set()).add(branch)
+        return {repo_name: [branch for branch in branches if branch in changed[repo_name]]
+                for repo_name in repo_names
+                if repo_name in changed and any(branch in changed[repo_name] for branch in branches)}
+
+    def applied_heads(self, org_name, operation):
+        """Return a dict mapping (repository, branch) to the head the operation was last applied at."""
+        with self._lock:
+            rows = self._connection.execute("SELECT repo, branch, head FROM applied WHERE org = ? AND operation = ?",
+                                            (org_name, operation))
+            return {(repo_name, branch): head for repo_name, branch, head in rows}
+
+    def record_applied(self, org_name, repo_name, heads, operation):
+        """Record the heads of the branches after the operation was applied and pushed successfully."""
+        now = time.time()
+        with self._lock, self._connection:
+            for branch, head in heads.items():
+                self._connection.execute("INSERT OR REPLACE INTO applied VALUES (?, ?, ?, ?, ?, ?)",
+                                         (org_name, repo_name, branch, operation, head, now))
+                # The index already knows the new head, no refresh is needed to skip the branch next time
+                self._connection.execute("UPDATE branches SET head = ? WHERE org = ? AND repo = ? AND branch = ?",
+                                         (head, org_name, repo_name, branch))
+
+    def forget(self, org_name, operation=None):
+        """Forget where the operations (or one operation) were applied, so the next run processes everything."""
+        with self._lock, self._connection:
+            if operation is None:
+                self._connection.execute("DELETE FROM applied WHERE org = ?", (org_name,))
+            else:
+                self._connection.execute("DELETE FROM applied WHERE org = ? AND operation = ?",
+                                         (org_name, operation))
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    if len(sys.argv) < 2:
+        print('Usage: python repo_index.py <org> [forget]')
+        sys.exit(1)
+    index = RepoIndex()
+    if sys.argv[2:] == ['forget']:
+        index.forget(sys.argv[1])
+        print(f'Forgot all applied operations in {sys.argv[1]}')
+    else:
+        index.refresh(sys.argv[1])
+        for repo_name in index.repos(sys.argv[1]):
+            heads = ', '.join(f"{branch}={head[:7]}" for branch, head in sorted(index.heads(sys.argv[1], repo_name).items()))
+            print(f"{repo_name}: {heads}")
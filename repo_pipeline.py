@@ -0,0 +1,60 @@
+from command_runner import timed
+from git_utils import SPARSE_CLONE
+from repo_executor import DEFAULT_MAX_WORKERS, run_batch
+from repo_index import operation_key
+from repo_planner import plan_batch, print_plan
+
+
+def pipeline_sparse_paths(steps):
+    """Return the sparse checkout patterns of all steps, without duplicates."""
+    paths = []
+    for step in steps:
+        paths += [path for path in step.sparse_paths() if path not in paths]
+    return paths
+
+
+def pipeline_operation(steps):
+    """Return the operation key of the ordered steps, used by the RepoIndex to skip unchanged branches."""
+    return operation_key('pipeline', *[operation_key(step.name, *step.parameters()) for step in steps])
+
+
+def run_pipeline(org_name, repo_names, branches, github_token, steps, commit_message=None,
+                 max_workers=DEFAULT_MAX_WORKERS, cache=None, profile=SPARSE_CLONE, index=None, plan_only=False):
+    """
+    Apply an ordered list of steps to each branch of the repositories in a single pass.
+
+    Each repository is cloned once, all steps edit the same worktree of a branch, and the result is
+    one commit per branch and one push per repository. A step is an object with:
+
+        name: A short name, e.g. 'overlay'.
+        description: What the step does, used for the default commit message.
+        sparse_paths(): The paths the step reads or writes, checked out by a sparse profile.
+        parameters(): The values that define the step, hashed into the operation key.
+        apply(repo_path, branch): Edits the working tree; returns a truthy value if it changed something.
+
+    See OverlayStep, RequirementsStep, AutogradingStep and LintStep.
+
+    Args:
+        branches (list): The branches to process, or a dict mapping each repository to its own branches.
+        commit_message (callable): Called as commit_message(branch); by default lists the step descriptions.
+        index (RepoIndex): Only process the branches that changed since the same steps were last applied.
+        plan_only (bool): Only print and return the BatchPlan of the run, nothing is cloned or written.
+    """
+    if plan_only:
+        plan = plan_batch(org_name, repo_names, branches, index, pipeline_operation(steps), cache)
+        print_plan(plan, max_workers)
+        return plan
+
+    if commit_message is None:
+        descriptions = '; '.join(step.description for step in steps)
+        commit_message = lambda branch: f"{descriptions} on {branch} branch"
+
+    def edit_branch(repo_path, branch):
+        changed = False
+        for step in steps:
+            with timed(f'step {step.name}'):
+                changed = bool(step.apply(repo_path, branch)) or changed
+        return changed
+
+    return run_batch(org_name, repo_names, branches, github_token, edit_branch, commit_message, max_workers, cache,
+                     profile, pipeline_sparse_paths(steps), index=index, operation=pipeline_operation(steps))
@@ -0,0 +1,89 @@
+import math
+from dataclasses import dataclass, field
+
+from github_client import get_client
+from org_inventory import BATCH_SIZE, fetch_repos_inventory
+from repo_executor import branch_lists
+
+
+@dataclass
+class BatchPlan:
+    """
+    What a batch run would do, predicted without cloning or writing anything.
+
+    targets maps each repository that would be processed to its branches; skipped maps the other
+    repositories to the reason. download_bytes only counts repositories without a cached mirror.
+    """
+    org_name: str
+    targets: dict = field(default_factory=dict)
+    skipped: dict = field(default_factory=dict)
+    clones: int = 0
+    cached_mirrors: int = 0
+    download_bytes: int = 0
+    max_pushes: int = 0
+    api_requests: int = 0
+    rate_limit: dict = field(default_factory=dict)
+
+
+def plan_batch(org_name, repo_names, branches, index=None, operation=None, cache=None):
+    """
+    Predict which repositories and branches a batch run would process and what it would cost.
+
+    The heads and sizes (diskUsage) of the repositories are looked up with the GraphQL inventory.
+    With a RepoIndex and an operation key, branches whose head didn't move since the operation was
+    last applied are predicted to be skipped. The index is only read, it isn't refreshed.
+    branches is a list or a dict mapping each repository to its own branches.
+
+    Returns:
+    BatchPlan: The plan, including the current rate limit budget (GET /rate_limit is free).
+    """
+    client = get_client()
+    branches, requested = branch_lists(repo_names, branches)
+    inventory = fetch_repos_inventory(org_name, list(repo_names), branches, fields=['diskUsage'])
+    applied = index.applied_heads(org_name, operation) if index is not None and operation else {}
+    plan = BatchPlan(org_name)
+
+    for repo_name in repo_names:
+        repo = inventory[repo_name]
+        if repo is None:
+            plan.skipped[repo_name] = 'does not exist'
+            continue
+        existing = repo.existing_branches(requested[repo_name])
+        selected = [branch for branch in existing if applied.get((repo_name, branch)) != repo.heads[branch]]
+        if not existing:
+            plan.skipped[repo_name] = 'none of the branches exist'
+        elif not selected:
+            plan.skipped[repo_name] = 'unchanged since the last run'
+        else:
+            plan.targets[repo_name] = selected
+            if cache is not None and (cache.mirror_path(org_name, repo_name) / 'HEAD').exists():
+                plan.cached_mirrors += 1
+            else:
+                plan.download_bytes += (repo.fields.get('diskUsage') or 0) * 1024
+
+    plan.clones = len(plan.targets)
+    plan.max_pushes = len(plan.targets)
+    # The run itself looks up the inventory again, the git operations don't use the API
+    plan.api_requests = math.ceil(len(repo_names) / BATCH_SIZE)
+    plan.rate_limit = client.get_json('rate_limit')['resources']
+    return plan
+
+
+def print_plan(plan, max_workers=None):
+    """Print the plan."""
+    print(f"Plan for {plan.org_name}: {plan.clones} repositories to process, {len(plan.skipped)} skipped")
+    for repo_name, branches in plan.targets.items():
+        print(f"  process {repo_name}: {', '.join(branches)}")
+    for repo_name, reason in plan.skipped.items():
+        print(f"  skip    {repo_name}: {reason}")
+
+    print(f"Clones: {plan.clones} ({plan.cached_mirrors} from cached mirrors, only fetching new commits)")
+    print(f"Download: at most {plan.download_bytes / 1024 ** 2:.1f} MB (less with a shallow or sparse profile)")
+    print(f"Pushes: at most {plan.max_pushes}")
+    if max_workers:
+        print(f"Workers: {max_workers}, about {math.ceil(plan.clones / max(1, max_workers))} repositories per worker")
+    for resource in ('core', 'graphql'):
+        limit = plan.rate_limit.get(resource)
+        if limit:
+            print(f"API {resource}: {limit['remaining']} of {limit['limit']} requests left")
+    print(f"API requests of the run: {plan.api_requests} GraphQL")
@@ -0,0 +1,124 @@
+import re
+from dataclasses import dataclass
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+
+# Version specifier operators, a value without one is pinned with ==
+SPECIFIER_OPERATORS = ('===', '==', '!=', '~=', '>=', '<=', '>', '<')
+
+# A comment starts with # at the beginning of the line or after whitespace
+COMMENT = re.compile(r'(^|\s)#')
+
+# The package name and the optional extras at the start of a requirement
+NAME_AND_EXTRAS = re.compile(r'[A-Za-z0-9][A-Za-z0-9._-]*(\s*\[[^\]]*\])?')
+
+
+@dataclass
+class RequirementLine:
+    """
+    One line of a requirements file.
+
+    requirement is the parsed PEP 508 requirement, or None for blank lines, comments, options like
+    '-r other.txt' and anything else that isn't a requirement; those lines are always kept as they are.
+    """
+    indent: str
+    content: str
+    comment: str
+    newline: str
+    requirement: Requirement = None
+
+    @property
+    def name(self):
+        """The normalized package name, e.g. 'python-dotenv' for 'Python_Dotenv'."""
+        return canonicalize_name(self.requirement.name) if self.requirement else None
+
+    def __str__(self):
+        return f"{self.indent}{self.content}{self.comment}{self.newline}"
+
+
+def parse_requirements(text):
+    """Parse the text of a requirements file into RequirementLines that reproduce the text exactly."""
+    lines = []
+    for raw_line in text.splitlines(keepends=True):
+        body = raw_line.rstrip('\r\n')
+        newline = raw_line[len(body):]
+        match = COMMENT.search(body)
+        code, comment = (body[:match.start()], body[match.start():]) if match else (body, '')
+        stripped = code.strip()
+        # Keep the whitespace before an inline comment with the comment
+        indent, content = code[:len(code) - len(code.lstrip())], stripped
+        comment = code[len(indent) + len(stripped):] + comment
+
+        requirement = None
+        if stripped and not stripped.startswith('-'):
+            try:
+                requirement = Requirement(stripped)
+            except InvalidRequirement:
+                pass
+        lines.append(RequirementLine(indent, content, comment, newline, requirement))
+    return lines
+
+
+def specifier_for(version):
+    """Return the specifier for a version like '3.2.7' (pinned with ==) or '>=3.2' (used as given)."""
+    version = str(version).strip()
+    return version if version.startswith(SPECIFIER_OPERATORS) else f"=={version}"
+
+
+def pinned_version(requirement):
+    """Return the version of a requirement pinned with ==, or None."""
+    specifiers = list(requirement.specifier)
+    if len(specifiers) == 1 and specifiers[0].operator in ('==', '==='):
+        return specifiers[0].version
+    return None
+
+
+def replace_version(content, version):
+    """
+    Return the requirement text with a new version specifier.
+    The name as written, the extras and the environment marker are kept exactly as they were.
+    """
+    head, separator, marker = content.partition(';')
+    name_and_extras = NAME_AND_EXTRAS.match(head).group(0)
+    spacing = head[len(head.rstrip()):]
+    return f"{name_and_extras}{specifier_for(version)}{spacing}{separator}{marker}"
+
+
+def update_requirements(text, packages_to_add=None, packages_to_remove=None):
+    """
+    Return the text of a requirements file with packages added, updated or removed.
+
+    Only the lines of the affected packages change; comments, blank lines, options and the other
+    requirements are kept exactly as they were. The arguments aren't modified.
+
+    Args:
+        text (str): The current content of requirements.txt.
+        packages_to_add (dict): Packages to add or update, e.g. {"pylint": "3.2.7", "requests": ">=2.25"}.
+        packages_to_remove (list): Packages to remove, e.g. ["unused_package"].
+
+    Returns:
+        str: The new content.
+    """
+    to_add = {canonicalize_name(name): version for name, version in (packages_to_add or {}).items()}
+    to_remove = {canonicalize_name(name) for name in packages_to_remove or []}
+    names = {canonicalize_name(name): name for name in packages_to_add or {}}
+
+    updated = []
+    found = set()
+    for line in parse_requirements(text):
+        if line.name in to_remove:
+            continue
+        if line.name in to_add:
+            line.content = replace_version(line.content, to_add[line.name])
+            found.add(line.name)
+        updated.append(line)
+
+    new_text = ''.join(str(line) for line in updated)
+    missing = [name for name in to_add if name not in found]
+    if missing:
+        newline = next((line.newline for line in updated if line.newline), '\n')
+        if new_text and not new_text.endswith(('\n', '\r')):
+            new_text += newline
+        new_text += ''.join(f"{names[name]}{specifier_for(to_add[name])}{newline}" for name in missing)
+    return new_text
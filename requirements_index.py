@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from packaging.utils import canonicalize_name
+
+from github_client import GitHubError
+from org_inventory import fetch_file_texts, fetch_org_inventory
+from requirements_file import parse_requirements, pinned_version
+
+# Location of the index, can be overridden with PYGRADER_CACHE_DIR
+DEFAULT_INDEX_PATH = (Path(os.getenv('PYGRADER_CACHE_DIR', Path.home() / '.cache' / 'pygrader_helper'))
+                      / 'requirements_index.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    org TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    blob TEXT,
+    refreshed REAL NOT NULL,
+    PRIMARY KEY (org, repo, branch)
+);
+CREATE TABLE IF NOT EXISTS pins (
+    org TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    package TEXT NOT NULL,
+    specifier TEXT NOT NULL,
+    version TEXT,
+    line TEXT NOT NULL,
+    PRIMARY KEY (org, repo, branch, package)
+);
+"""
+
+
+class RequirementsIndex:
+    """
+    Local SQLite index of which repository and branch requires which package at which version.
+
+    It is built from the requirements.txt files only, fetched through the GraphQL API for 100
+    repositories per request, so questions like "who still pins pylint 3.2.6?" need no clone.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def refresh(self, org_name, repo_names=None, branches=('main', 'solution')):
+        """Fetch the requirements.txt of the branches of the listed repositories (or the whole organization)."""
+        if repo_names is None:
+            repo_names = sorted(fetch_org_inventory(org_name))
+        files = fetch_file_texts(org_name, list(repo_names), list(branches), 'requirements.txt')
+
+        now = time.time()
+        with self._lock, self._connection:
+            for (repo_name, branch), file in files.items():
+                self._connection.execute("DELETE FROM pins WHERE org = ? AND repo = ? AND branch = ?",
+                                         (org_name, repo_name, branch))
+                self._connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                                         (org_name, repo_name, branch, file[0] if file else None, now))
+                if not file or file[1] is None:
+                    continue
+                pins = {}
+                for line in parse_requirements(file[1]):
+                    if line.requirement is not None:
+                        pins[line.name] = (org_name, repo_name, branch, line.name, str(line.requirement.specifier),
+                                           pinned_version(line.requirement), line.content)
+                self._connection.executemany("INSERT INTO pins VALUES (?, ?, ?, ?, ?, ?, ?)", pins.values())
+        return len(files)
+
+    def who_requires(self, package, version=None, org_name=None):
+        """
+        Return (org, repository, branch, specifier) for every branch that requires the package,
+        or only the branches that pin it to the version with ==.
+        """
+        query = "SELECT org, repo, branch, specifier FROM pins WHERE package = ?"
+        parameters = [canonicalize_name(package)]
+        if version is not None:
+            query += " AND version = ?"
+            parameters.append(version)
+        if org_name is not None:
+            query += " AND org = ?"
+            parameters.append(org_name)
+        with self._lock:
+            return self._connection.execute(query + " ORDER BY org, repo, branch", parameters).fetchall()
+
+    def versions(self, package, org_name=None):
+        """Return a dict mapping each specifier of the package to the number of branches using it."""
+        query = "SELECT specifier, COUNT(*) FROM pins WHERE package = ?"
+        parameters = [canonicalize_name(package)]
+        if org_name is not None:
+            query += " AND org = ?"
+            parameters.append(org_name)
+        with self._lock:
+            return dict(self._connection.execute(query + " GROUP BY specifier ORDER BY specifier", parameters))
+
+    def missing_files(self, org_name):
+        """Return (repository, branch) for the indexed branches without a requirements.txt."""
+        with self._lock:
+            return self._connection.execute("SELECT repo, branch FROM files WHERE org = ? AND blob IS NULL "
+                                            "ORDER BY repo, branch", (org_name,)).fetchall()
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    index = RequirementsIndex()
+    if sys.argv[1:2] == ['refresh'] and len(sys.argv) > 2:
+        try:
+            print(f"Indexed {index.refresh(sys.argv[2], branches=sys.argv[3:] or ('main', 'solution'))} branches")
+        except GitHubError as e:
+            print(f'Failed to fetch the requirements: {e}')
+    elif sys.argv[1:2] == ['who'] and len(sys.argv) > 2:
+        version = sys.argv[3] if len(sys.argv) > 3 else None
+        for org_name, repo_name, branch, specifier in index.who_requires(sys.argv[2], version):
+            print(f"{org_name}/{repo_name} [{branch}]: {sys.argv[2]}{specifier}")
+        print(f"Specifiers: {index.versions(sys.argv[2])}")
+    else:
+        print('Usage: python requirements_index.py refresh <org> [branches...]\n'
+              '       python requirements_index.py who <package> [version]')
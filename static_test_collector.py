@@ -0,0 +1,285 @@
+import ast
+import builtins
+import fnmatch
+import os
+
+"""
+Finds the tests of a project by parsing the test files with ast, without importing or running anything.
+Gives the same names as pytest collection for plain test functions, Test* classes and unittest.TestCase
+methods. Anything it can't resolve statically raises UnresolvableTests, so the caller can fall back to pytest.
+"""
+
+# The default test file patterns of pytest
+TEST_FILE_PATTERNS = ('test_*.py', '*_test.py')
+
+# The default norecursedirs of pytest
+SKIPPED_FOLDER_PATTERNS = ('*.egg', '.*', '_darcs', 'build', 'CVS', 'dist', 'node_modules', 'venv', '{arch}')
+
+# Configuration files and the pytest options in them that change what is collected
+CONFIG_FILES = ('pytest.ini', 'pyproject.toml', 'tox.ini', 'setup.cfg')
+COLLECTION_OPTIONS = ('python_files', 'python_classes', 'python_functions', 'testpaths', 'norecursedirs',
+                      'addopts', 'collect_ignore')
+
+# Decorators that keep a test function a single test; any other decorator can change what pytest collects
+SAFE_DECORATORS = ('staticmethod', 'classmethod', 'unittest.skip', 'unittest.skipIf', 'unittest.skipUnless',
+                   'unittest.expectedFailure')
+
+# Functions that generate tests at collection time, in a module or a class
+GENERATOR_HOOKS = ('pytest_generate_tests', 'load_tests')
+
+# Base classes of unittest test cases
+TESTCASE_BASES = ('TestCase', 'unittest.TestCase', 'IsolatedAsyncioTestCase', 'unittest.IsolatedAsyncioTestCase')
+
+
+class UnresolvableTests(Exception):
+    """The tests of a project can't be found without running pytest, e.g. because of parametrize."""
+
+
+def dotted_name(node):
+    """Return the dotted name of a Name or Attribute node like 'unittest.TestCase', or None."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        parent = dotted_name(node.value)
+        return f'{parent}.{node.attr}' if parent else None
+    return None
+
+
+def is_test_name(name):
+    return name.startswith('test')
+
+
+def is_test_class_name(name):
+    return name.startswith('Test')
+
+
+def check_fixtures(tree, file_path):
+    """Raise UnresolvableTests for parametrized fixtures, they multiply the tests using them."""
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and (dotted_name(node.func) or '').endswith('fixture')
+                and any(keyword.arg == 'params' for keyword in node.keywords)):
+            raise UnresolvableTests(f'{file_path}:{node.lineno}: parametrized fixture')
+
+
+def is_data(node):
+    """Return True if the statement assigns literal data, which pytest never collects, e.g. test_data = [1, 2]."""
+    literals = (ast.Constant, ast.List, ast.Tuple, ast.Dict, ast.Set, ast.ListComp, ast.DictComp, ast.SetComp)
+    return isinstance(node, (ast.Assign, ast.AnnAssign)) and isinstance(node.value, literals)
+
+
+def defines_test_names(node):
+    """
+    Return True if the statement defines, imports or assigns a name pytest could collect,
+    or assigns pytestmark, whose marks (e.g. parametrize) apply to all tests of the module or class.
+    """
+    if any(isinstance(child, ast.Name) and child.id == 'pytestmark' and isinstance(child.ctx, ast.Store)
+           for child in ast.walk(node)):
+        return True
+    if is_data(node) or isinstance(node, ast.ImportFrom) and node.module == 'unittest':
+        return False
+    names = []
+    for child in ast.walk(node):
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.append(child.name)
+        elif isinstance(child, ast.alias):
+            names.append((child.asname or child.name).split('.')[0])
+        elif isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+            names.append(child.id)
+    return any(name == '*' or name == '__test__' or is_test_name(name) or is_test_class_name(name)
+               for name in names)
+
+
+class ModuleCollector:
+    """Collects the test names of one parsed test file in the order pytest would."""
+
+    def __init__(self, tree, file_path):
+        self.file_path = file_path
+        self.classes = {}
+        self.unittest_names = self.imported_names(tree, 'unittest')
+        self.pytest_names = self.imported_names(tree, 'pytest')
+        self.testcase_names = {'TestCase', 'IsolatedAsyncioTestCase'} & self.unittest_names
+        self.tree = tree
+
+    @staticmethod
+    def imported_names(tree, module):
+        """Return the names imported from the module with 'from module import ...' (without 'as')."""
+        return {alias.name for node in tree.body if isinstance(node, ast.ImportFrom)
+                and node.module == module for alias in node.names if alias.asname is None}
+
+    def unresolvable(self, node, reason):
+        return UnresolvableTests(f'{self.file_path}:{node.lineno}: {reason}')
+
+    def is_safe_decorator(self, name):
+        """Return True if the decorator keeps the test a single test: a mark other than parametrize or a skip."""
+        if name in SAFE_DECORATORS or f'unittest.{name}' in SAFE_DECORATORS and name in self.unittest_names:
+            return True
+        is_mark = name.startswith('pytest.mark.') or name.startswith('mark.') and 'mark' in self.pytest_names
+        return is_mark and name.count('.') == name.startswith('pytest.') + 1 and not name.endswith('.parametrize')
+
+    def check_decorators(self, node):
+        """Raise UnresolvableTests for decorators that may turn a test into several tests or into no test."""
+        for decorator in node.decorator_list:
+            target = decorator.func if isinstance(decorator, ast.Call) else decorator
+            name = dotted_name(target)
+            if name is None or not self.is_safe_decorator(name):
+                raise self.unresolvable(node, f'{node.name} is decorated with {ast.unparse(target)}')
+
+    def is_testcase(self, node):
+        """Return True if the class is a unittest.TestCase, following the base classes defined in the file."""
+        for base in node.bases:
+            name = dotted_name(base)
+            if name in TESTCASE_BASES and (name.startswith('unittest.') or name in self.testcase_names):
+                return True
+            if name in self.classes:
+                if self.is_testcase(self.classes[name]):
+                    return True
+            elif name is None or not hasattr(builtins, name):
+                raise self.unresolvable(node, f'base class {name or ast.unparse(base)} of {node.name} is unknown')
+        return False
+
+    def mro(self, node):
+        """Return the class and its base classes defined in the file, in method resolution order."""
+        classes = [node]
+        for base in node.bases:
+            name = dotted_name(base)
+            if name in self.classes:
+                classes += [cls for cls in self.mro(self.classes[name]) if cls not in classes]
+        return classes
+
+    def class_tests(self, node, nested=True):
+        """
+        Return the tests of a class including the inherited ones, in pytest's order: the tests of the
+        most basic class first, a test redefined in a subclass with the subclass, and within a class
+        the test methods and nested Test* classes in the order they are defined.
+        """
+        seen = set()
+        groups = []
+        for cls in self.mro(node):
+            group = []
+            for child in cls.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    if is_test_name(child.name):
+                        self.check_decorators(child)
+                    if child.name not in seen and is_test_name(child.name):
+                        group.append(child.name)
+                elif isinstance(child, ast.ClassDef):
+                    if child.name not in seen and nested and is_test_class_name(child.name):
+                        group += self.collect_class(child)
+                else:
+                    continue
+                seen.add(child.name)
+            groups.append(group)
+        return [name for group in reversed(groups) for name in group]
+
+    def collect_class(self, node):
+        """Return the test names of a class, or [] if pytest doesn't collect it."""
+        # The attributes and hooks of the base classes apply to the class as well
+        for cls in self.mro(node):
+            for child in cls.body:
+                if isinstance(child, (ast.Assign, ast.AnnAssign)) and defines_test_names(child):
+                    raise self.unresolvable(child, f'class {cls.name} assigns test attributes or pytestmark')
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and child.name in GENERATOR_HOOKS:
+                    raise self.unresolvable(child, f'class {cls.name} generates tests with {child.name}')
+        if self.is_testcase(node):
+            self.check_decorators(node)
+            # unittest sorts the test methods by name and doesn't look at nested classes
+            return sorted(self.class_tests(node, nested=False))
+        if not is_test_class_name(node.name):
+            return []
+        if any(isinstance(child, ast.FunctionDef) and child.name in ('__init__', '__new__')
+               for cls in self.mro(node) for child in cls.body):
+            # pytest skips Test* classes with a constructor, also an inherited one
+            return []
+        self.check_decorators(node)
+        return self.class_tests(node)
+
+    def collect(self):
+        """Return the test names of the module."""
+        # Like the module namespace: a redefined name keeps its first position but its last definition
+        definitions = {}
+        for node in self.tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                definitions[node.name] = node
+            elif isinstance(node, ast.ClassDef):
+                definitions[node.name] = node
+                self.classes[node.name] = node
+            elif defines_test_names(node):
+                raise self.unresolvable(node, 'tests are imported, assigned or defined conditionally')
+
+        if any(hook in definitions for hook in GENERATOR_HOOKS):
+            raise UnresolvableTests(f'{self.file_path}: tests are generated at collection time')
+
+        names = []
+        for name, node in definitions.items():
+            if isinstance(node, ast.ClassDef):
+                names += self.collect_class(node)
+            elif is_test_name(name):
+                self.check_decorators(node)
+                names.append(name)
+        return names
+
+
+def check_project(project_folder):
+    """Raise UnresolvableTests if a pytest configuration changes how the tests are collected."""
+    for config_file in CONFIG_FILES:
+        path = os.path.join(project_folder, config_file)
+        if not os.path.isfile(path):
+            continue
+        with open(path, encoding='utf-8') as file:
+            content = file.read()
+        uses_options = 'pytest' in content and any(option in content for option in COLLECTION_OPTIONS)
+        if config_file == 'pytest.ini' or uses_options:
+            raise UnresolvableTests(f'{path}: pytest configuration')
+
+
+def check_conftest(file_path):
+    """Raise UnresolvableTests if a conftest.py defines pytest hooks or parametrized fixtures."""
+    tree = parse_file(file_path)
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name.startswith('pytest_'):
+            raise UnresolvableTests(f'{file_path}:{node.lineno}: hook {node.name}')
+        if isinstance(node, ast.Assign) and 'collect_ignore' in ast.unparse(node):
+            raise UnresolvableTests(f'{file_path}:{node.lineno}: collect_ignore')
+    check_fixtures(tree, file_path)
+
+
+def parse_file(file_path):
+    """Parse a Python file, raising UnresolvableTests if it isn't valid Python."""
+    try:
+        with open(file_path, 'rb') as file:
+            return ast.parse(file.read(), filename=file_path)
+    except (SyntaxError, ValueError) as e:
+        raise UnresolvableTests(f'{file_path}: {e}') from e
+
+
+def find_test_files(project_folder):
+    """Return the test files below the project folder in the order pytest collects them."""
+    test_files = []
+    entries = sorted(os.scandir(project_folder), key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir():
+            if any(fnmatch.fnmatch(entry.name, pattern) for pattern in SKIPPED_FOLDER_PATTERNS) \
+                    or os.path.exists(os.path.join(entry.path, 'pyvenv.cfg')):
+                continue
+            test_files += find_test_files(entry.path)
+        elif entry.name == 'conftest.py':
+            check_conftest(entry.path)
+        elif any(fnmatch.fnmatch(entry.name, pattern) for pattern in TEST_FILE_PATTERNS):
+            test_files.append(entry.path)
+    return test_files
+
+
+def discover_tests(project_folder):
+    """
+    Find the names of the tests in the project folder without importing anything
+    :param project_folder: Path to the project folder
+    :return: List of test names, in the order pytest would collect them
+    :raises UnresolvableTests: If the tests can only be found by running pytest
+    """
+    check_project(project_folder)
+    names = []
+    for file_path in find_test_files(project_folder):
+        tree = parse_file(file_path)
+        check_fixtures(tree, file_path)
+        names += ModuleCollector(tree, file_path).collect()
+    return names
@@ -0,0 +1,54 @@
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# The scripts live in the root folder of the repository
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class FakeGitHub(ThreadingHTTPServer):
+    """Local fake API server answering each request with the next queued (status, headers, body)."""
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeHandler)
+        self.responses = []
+        self.requests = []
+        self.request_headers = []
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    def handle_request(self):
+        self.server.requests.append((self.command, self.path))
+        self.server.request_headers.append(dict(self.headers))
+        status, headers, body = self.server.responses.pop(0) if self.server.responses else (200, {}, {})
+        # A body of None sends no content, e.g. for a 304
+        content = json.dumps(body).encode() if body is not None else b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_DELETE = handle_request
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FakeGitHub()
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
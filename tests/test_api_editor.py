@@ -0,0 +1,51 @@
+import base64
+
+import pytest
+
+from api_editor import BranchEditor, FileEdit, git_blob_sha
+from github_client import GitHubError
+
+
+class FakeClient:
+    """Records the GraphQL mutations; the branch only moves if it is still at expectedHeadOid."""
+
+    def __init__(self, head):
+        self.head = head
+        self.mutations = []
+
+    def graphql(self, query, variables=None, retry=True):
+        self.mutations.append((variables['input'], retry))
+        if variables['input']['expectedHeadOid'] != self.head:
+            raise GitHubError('GraphQL query failed: [STALE_DATA]')
+        self.head = 'new'
+        return {'createCommitOnBranch': {'commit': {'oid': 'new'}}}
+
+
+def test_commit_sends_the_expected_head():
+    client = FakeClient('head')
+    editor = BranchEditor('org', 'repo', client)
+    current = {'requirements.txt': (git_blob_sha(b'pylint==3.2.6\n'), 'pylint==3.2.6\n')}
+    edits = {'requirements.txt': FileEdit(lambda text: text.replace('3.2.6', '3.2.7'))}
+    assert editor.commit('main', 'head', 'tree', current, edits, 'Update pylint\n\nDetails') == 'new'
+
+    mutation, retry = client.mutations[0]
+    assert mutation['expectedHeadOid'] == 'head'
+    assert mutation['message'] == {'headline': 'Update pylint', 'body': 'Details'}
+    assert base64.b64decode(mutation['fileChanges']['additions'][0]['contents']) == b'pylint==3.2.7\n'
+    assert retry is False
+
+
+def test_a_branch_that_moved_is_not_overwritten():
+    client = FakeClient('reset-to-older-commit')
+    editor = BranchEditor('org', 'repo', client)
+    with pytest.raises(GitHubError):
+        editor.commit('main', 'head', 'tree', {}, {'a.txt': FileEdit(lambda text: 'a')}, 'Add a')
+    assert client.head == 'reset-to-older-commit'
+
+
+def test_unchanged_files_are_not_committed():
+    client = FakeClient('head')
+    editor = BranchEditor('org', 'repo', client)
+    current = {'a.txt': (git_blob_sha(b'a'), 'a')}
+    assert editor.commit('main', 'head', 'tree', current, {'a.txt': FileEdit(lambda text: 'a')}, 'Add a') is None
+    assert client.mutations == []
@@ -0,0 +1,83 @@
+import pytest
+
+import github_client
+from github_client import GitHubClient, GitHubError
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the waits instead of sleeping."""
+    delays = []
+    monkeypatch.setattr(github_client.time, 'sleep', delays.append)
+    return delays
+
+
+@pytest.fixture
+def client(server):
+    return GitHubClient('token', base_url=server.url, max_retries=3, backoff=0.01)
+
+
+def test_get_is_retried_on_server_errors(server, client, sleeps):
+    server.responses = [(502, {}, {}), (503, {}, {}), (200, {}, {'ok': True})]
+    assert client.get_json('repos/org/repo') == {'ok': True}
+    assert len(server.requests) == 3
+    assert len(sleeps) == 2
+
+
+def test_get_fails_after_all_retries(server, client, sleeps):
+    server.responses = [(500, {}, {})] * 4
+    with pytest.raises(GitHubError):
+        client.get('repos/org/repo')
+    assert len(server.requests) == 4
+
+
+def test_post_is_not_retried_on_server_errors(server, client, sleeps):
+    server.responses = [(502, {}, {}), (200, {}, {})]
+    with pytest.raises(GitHubError):
+        client.post('repos/org/repo/transfer', json={'new_owner': 'other'})
+    assert server.requests == [('POST', '/repos/org/repo/transfer')]
+
+
+def test_post_is_retried_when_allowed(server, client, sleeps):
+    server.responses = [(502, {}, {}), (201, {}, {'sha': 'abc'})]
+    assert client.post('repos/org/repo/git/blobs', json={}, retry=True).json() == {'sha': 'abc'}
+    assert len(server.requests) == 2
+
+
+def test_graphql_is_retried(server, client, sleeps, monkeypatch):
+    monkeypatch.delenv('GITHUB_GRAPHQL_URL', raising=False)
+    server.responses = [(502, {}, {}), (200, {}, {'data': {'r0': None}})]
+    assert client.graphql('query { r0: repository(owner: "org", name: "repo") { name } }') == {'r0': None}
+    assert len(server.requests) == 2
+
+
+def test_post_is_not_retried_on_connection_errors(client, sleeps, monkeypatch):
+    calls = []
+
+    def refuse(*args, **kwargs):
+        calls.append(args)
+        raise github_client.requests.ConnectionError('refused')
+
+    monkeypatch.setattr(client.session, 'request', refuse)
+    with pytest.raises(GitHubError):
+        client.post('repos/org/repo/transfer')
+    assert len(calls) == 1
+    with pytest.raises(GitHubError):
+        client.get('repos/org/repo')
+    assert len(calls) == 1 + 4
+
+
+def test_secondary_rate_limit_is_waited_out_for_all_methods(server, client, sleeps):
+    server.responses = [(403, {'Retry-After': '7'}, {}), (201, {}, {})]
+    client.post('repos/org/repo/transfer')
+    assert len(server.requests) == 2
+    assert sleeps == [7.0]
+
+
+def test_exhausted_rate_limit_waits_for_the_reset(server, client, sleeps, monkeypatch):
+    monkeypatch.setattr(github_client.time, 'time', lambda: 1000)
+    server.responses = [(403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '1030'}, {}), (200, {}, {})]
+    client.get('repos/org/repo')
+    assert len(server.requests) == 2
+    # Waited once for the retry and once more before the next request, until the reset has passed
+    assert sleeps[0] == 31
@@ -0,0 +1,39 @@
+import requests
+
+from github_client import GitHubClient
+from http_cache import HttpCache
+
+
+def make_response(body, etag='"v1"'):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = 'https://api.github.com/repos/org/repo'
+    response.headers['ETag'] = etag
+    response._content = body
+    return response
+
+
+def test_overwriting_an_entry_keeps_the_size_exact(tmp_path):
+    cache = HttpCache(tmp_path)
+    key = cache.key('https://api.github.com/repos/org/repo')
+    cache.put(key, make_response(b'x' * 1000))
+    for etag in ('"v2"', '"v3"', '"v4"'):
+        cache.put(key, make_response(b'y' * 100, etag))
+    assert cache._size == cache.size()
+    assert len(cache.entries()) == 1
+
+
+
+def test_not_modified_is_served_from_the_cache(server, tmp_path):
+    client = GitHubClient('token', base_url=server.url, cache=HttpCache(tmp_path))
+    link = f'<{server.url}/orgs/org/repos?page=2>; rel="next"'
+    server.responses = [(200, {'ETag': '"v1"', 'Link': link}, [{'name': 'repo'}]), (304, {}, None)]
+
+    first = client.get('orgs/org/repos')
+    second = client.get('orgs/org/repos')
+
+    assert 'If-None-Match' not in server.request_headers[0]
+    assert server.request_headers[1]['If-None-Match'] == '"v1"'
+    assert second.status_code == 200
+    assert second.json() == first.json() == [{'name': 'repo'}]
+    assert second.links['next']['url'] == f'{server.url}/orgs/org/repos?page=2'
@@ -0,0 +1,25 @@
+import threading
+
+from repo_executor import run_repos
+
+
+def test_run_repos_consumes_a_generator_once():
+    results = run_repos((name for name in ['a', 'b', 'c']), lambda repo_name, workdir: repo_name.upper(), 2)
+    assert [(result.repo_name, result.result) for result in results] == [('a', 'A'), ('b', 'B'), ('c', 'C')]
+
+
+def test_run_repos_starts_before_the_listing_ends():
+    first_processed = threading.Event()
+
+    def listing():
+        yield 'first'
+        # The next name is only listed once the first repository was processed
+        assert first_processed.wait(5)
+        yield 'second'
+
+    def process_repo(repo_name, workdir):
+        first_processed.set()
+        return workdir is None
+
+    results = run_repos(listing(), process_repo, 2, workdir=False)
+    assert [result.ok and result.result for result in results] == [True, True]
@@ -0,0 +1,215 @@
+import textwrap
+
+import pytest
+
+from static_test_collector import UnresolvableTests, discover_tests
+from unittest_json_generator import collect_test_names
+
+# Sample test files the static discovery resolves, each compared with the pytest collection
+RESOLVABLE = {
+    'functions': '''
+        test_data = [1, 2]
+
+        def test_one():
+            pass
+
+        def helper():
+            pass
+
+        def test_two():
+            pass
+
+        def test_one():
+            pass
+
+        async def test_async():
+            pass
+    ''',
+    'classes': '''
+        import pytest
+
+        class Base:
+            def test_base(self):
+                pass
+
+            def test_over(self):
+                pass
+
+        class TestA(Base):
+            def test_z(self):
+                pass
+
+            class TestInner:
+                def test_inner(self):
+                    pass
+
+            def test_over(self):
+                pass
+
+            @staticmethod
+            def test_static():
+                pass
+
+            @pytest.mark.skip
+            def test_skipped(self):
+                pass
+
+        class TestInit:
+            def __init__(self):
+                pass
+
+            def test_never(self):
+                pass
+
+        class MyError(Exception):
+            pass
+    ''',
+    'unittest': '''
+        import unittest
+        from unittest import TestCase
+
+        class U(TestCase):
+            def test_b(self):
+                pass
+
+            @unittest.skip('later')
+            def test_a(self):
+                pass
+
+            class TestNested:
+                def test_not_collected(self):
+                    pass
+
+        class V(U):
+            def test_c(self):
+                pass
+
+        if __name__ == '__main__':
+            unittest.main()
+    ''',
+    'inherited_init': '''
+        class Base:
+            def __init__(self):
+                pass
+
+        class TestX(Base):
+            def test_a(self):
+                pass
+
+        def test_plain():
+            pass
+    ''',
+    'input': '''
+        value = input('number: ')
+
+        def test_input():
+            pass
+    ''',
+}
+
+# Sample test files the static discovery must leave to pytest
+UNRESOLVABLE = {
+    'parametrize': '''
+        import pytest
+
+        @pytest.mark.parametrize('value', [1, 2])
+        def test_value(value):
+            pass
+    ''',
+    'property': '''
+        class TestA:
+            @property
+            def test_prop(self):
+                return 1
+    ''',
+    'fixture': '''
+        import pytest
+
+        class TestA:
+            @pytest.fixture
+            def test_fixture_named(self):
+                return 1
+    ''',
+    'imported': '''
+        from helpers import test_shared
+    ''',
+    'module_pytestmark': '''
+        import pytest
+
+        pytestmark = pytest.mark.parametrize('x', [1, 2])
+
+        def test_one(x):
+            pass
+    ''',
+    'class_pytestmark': '''
+        import pytest
+
+        class TestA:
+            pytestmark = [pytest.mark.parametrize('x', [1, 2])]
+
+            def test_one(self, x):
+                pass
+    ''',
+    'class_generate_tests': '''
+        class TestA:
+            def pytest_generate_tests(self, metafunc):
+                metafunc.parametrize('v', [1, 2])
+
+            def test_v(self, v):
+                pass
+    ''',
+    'unknown_base': '''
+        import unittest as ut
+
+        class T(ut.TestCase):
+            def test_x(self):
+                pass
+    ''',
+}
+
+
+def write_project(folder, source, name='sample'):
+    # pytest imports the samples in this process, so every sample module needs its own name
+    (folder / f'test_{name}.py').write_text(textwrap.dedent(source))
+    return str(folder)
+
+
+@pytest.fixture(autouse=True)
+def no_input(monkeypatch):
+    """Importing the samples must not wait for input when pytest collects them."""
+    monkeypatch.setattr('builtins.input', lambda *args: '')
+
+
+@pytest.mark.parametrize('name', RESOLVABLE)
+def test_same_names_as_pytest(tmp_path, name):
+    project_folder = write_project(tmp_path, RESOLVABLE[name], name)
+    assert discover_tests(project_folder) == collect_test_names(project_folder, static=False)
+
+
+@pytest.mark.parametrize('name', UNRESOLVABLE)
+def test_unresolvable(tmp_path, name):
+    project_folder = write_project(tmp_path, UNRESOLVABLE[name], name)
+    with pytest.raises(UnresolvableTests):
+        discover_tests(project_folder)
+    # The fallback gives the pytest result
+    assert collect_test_names(project_folder) == collect_test_names(project_folder, static=False)
+
+
+def test_nested_classes_keep_definition_order(tmp_path):
+    project_folder = write_project(tmp_path, '''
+        class TestOuter:
+            class TestInner:
+                def test_inner(self):
+                    pass
+
+            def test_after(self):
+                pass
+    ''', 'nested')
+    assert discover_tests(project_folder) == ['test_inner', 'test_after']
+
+
+def test_skips_hidden_folders_and_venv(tmp_path):
+    for folder in ('.hidden', 'venv', 'tests'):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / 'test_file.py').write_text(f'def test_{folder.strip(".")}():\n    pass\n')
+    assert discover_tests(str(tmp_path)) == ['test_tests']
@@ -0,0 +1,19 @@
+import json
+
+from unittest_json_generator import generate_unittests_json
+
+
+def test_writes_the_collected_tests(tmp_path):
+    (tmp_path / 'test_quotes.py').write_text(
+        'import pytest\n\n\n@pytest.mark.parametrize("text", [\'a"b\'])\ndef test_text(text):\n    pass\n')
+    generate_unittests_json(str(tmp_path))
+    unittests = json.loads((tmp_path / '.github' / 'autograding' / 'unittests2.json').read_text())
+    assert unittests == [{'name': 'test_text[a"b]', 'function': 'test_text[a"b]', 'timeout': 10, 'points': 1}]
+
+
+def test_collection_errors_are_printed_and_nothing_is_written(tmp_path, capsys):
+    (tmp_path / 'test_broken.py').write_text('import missing_module\n\n\ndef test_a():\n    pass\n')
+    (tmp_path / 'test_fine.py').write_text('def test_b():\n    pass\n')
+    generate_unittests_json(str(tmp_path), static=False)
+    assert 'missing_module' in capsys.readouterr().out
+    assert not (tmp_path / '.github' / 'autograding' / 'unittests2.json').exists()
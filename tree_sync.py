@@ -0,0 +1,95 @@
+import hashlib
+import os
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+
+
+@dataclass
+class ChangeSet:
+    """The relative paths a sync added, modified and deleted in the target."""
+    added: list = field(default_factory=list)
+    modified: list = field(default_factory=list)
+    deleted: list = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.added or self.modified or self.deleted)
+
+    def __str__(self):
+        return f"{len(self.added)} added, {len(self.modified)} modified, {len(self.deleted)} deleted"
+
+
+def file_hash(path):
+    """Return the SHA-256 of the file content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_files(root, exclude=('.git',)):
+    """Return a dict mapping the relative posix paths of the files below root to their paths, skipping excluded names."""
+    root = Path(root)
+    files = {}
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = [name for name in dir_names if name not in exclude]
+        for file_name in file_names:
+            if file_name not in exclude:
+                path = Path(dir_path) / file_name
+                files[path.relative_to(root).as_posix()] = path
+    return files
+
+
+def same_content(source_path, target_path):
+    """Compare two files by size first and by hash only if the sizes are equal."""
+    source_stat, target_stat = source_path.stat(), target_path.stat()
+    if source_stat.st_size != target_stat.st_size:
+        return False
+    if (source_stat.st_mode & 0o111) != (target_stat.st_mode & 0o111):
+        return False
+    return file_hash(source_path) == file_hash(target_path)
+
+
+def sync_tree(source_dir, target_dir, delete=False, exclude=('.git',)):
+    """
+    Make the files of target_dir equal to those of source_dir, writing only the files whose content differs.
+
+    Unchanged files are not touched, so their mtimes stay and a later 'git add' only has to look at real changes.
+
+    Args:
+        source_dir (str): The directory to copy from.
+        target_dir (str): The directory to copy to.
+        delete (bool): Also delete the files that only exist in the target.
+        exclude (tuple): File and directory names that are neither copied nor deleted.
+
+    Returns:
+        ChangeSet: The relative paths that were added, modified and deleted.
+    """
+    target_dir = Path(target_dir)
+    source_files = list_files(source_dir, exclude)
+    target_files = list_files(target_dir, exclude)
+    changes = ChangeSet()
+
+    for relative_path, source_path in sorted(source_files.items()):
+        target_path = target_files.get(relative_path)
+        if target_path is None:
+            changes.added.append(relative_path)
+            target_path = target_dir / relative_path
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+        elif same_content(source_path, target_path):
+            continue
+        else:
+            changes.modified.append(relative_path)
+        shutil.copy2(source_path, target_path)
+
+    if delete:
+        for relative_path in sorted(set(target_files) - set(source_files)):
+            target_files[relative_path].unlink()
+            changes.deleted.append(relative_path)
+            # Remove the directories that became empty
+            parent = target_files[relative_path].parent
+            while parent != target_dir and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+    return changes
@@ -1,29 +1,31 @@
-import sys
 import os
 import tkinter
-from io import StringIO
 from tkinter import filedialog
 import pytest
 import json
 
+from static_test_collector import UnresolvableTests, discover_tests
+
 """
 Generates the 'unittests2.json' based on the pytests and 'lint2.json' for linting.
 Used for the automatic grading in GitHub Classroom.
 """
 
-class Capturing(list):
+class CollectionPlugin:
     """
-    Captures the output to stdout and stderr
+    pytest plugin recording the names of the collected test items, e.g. 'test_add[1-2]',
+    and the errors of the files that couldn't be collected
     """
-    def __enter__(self):
-        self._stdout = sys.stdout
-        sys.stdout = self._stringio = StringIO()
-        return self
+    def __init__(self):
+        self.names = []
+        self.errors = []
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self.errors.append((report.nodeid, report.longreprtext))
 
-    def __exit__(self, *args):
-        self.extend(self._stringio.getvalue().splitlines())
-        del self._stringio  # free up some memory
-        sys.stdout = self._stdout
+    def pytest_collection_modifyitems(self, items):
+        self.names.extend(item.name for item in items)
 
 
 def main():
@@ -43,31 +45,48 @@ def main():
     generate_lint_json(project_folder)
 
 
-def generate_unittests_json(project_folder):
+def collect_test_names(project_folder, static=True):
+    """
+    Collect the names of the tests in the project folder without running them
+    :param project_folder: Path to the project folder
+    :param static: Parse the test files instead of importing them, pytest is only used if that isn't possible
+    :return: List of test names, or None if pytest couldn't collect all tests
+    """
+    if static:
+        try:
+            return discover_tests(project_folder)
+        except UnresolvableTests as e:
+            print(f'Collecting the tests with pytest, {e}')
+
+    plugin = CollectionPlugin()
+    # Without the terminal reporter nothing is rendered, without the cache provider no .pytest_cache is written
+    exit_code = pytest.main([project_folder, '--collect-only', '-p', 'no:terminal', '-p', 'no:cacheprovider'],
+                            plugins=[plugin])
+    # The terminal reporter is off, so the collection errors are printed here
+    for nodeid, error in plugin.errors:
+        print(f'Error collecting {nodeid or project_folder}:\n{error}')
+    if plugin.errors or exit_code not in (pytest.ExitCode.OK, pytest.ExitCode.NO_TESTS_COLLECTED):
+        print(f'pytest collection in {project_folder} failed: {exit_code!r}')
+        return None
+    return plugin.names
+
+
+def generate_unittests_json(project_folder, static=True):
     """
-    Generate unittests2.json based on pytest collection
+    Generate unittests2.json based on the collected tests
     :param project_folder: Path to the project folder
+    :param static: Find the tests without importing the code if possible (see static_test_collector.py)
     """
-    args = f'{project_folder} --collect-only'.split(' ')
-    with Capturing() as output:
-        pytest.main(args)
-    json_content = '[\n'
-    for line in output:
-        if '<Function' in line:
-            line = line.lstrip()
-            name = line[10:-1]
-            json_content += make_testcase(name) + ',\n'
-        elif '<TestCaseFunction' in line:
-            line = line.lstrip()
-            name = line[18:-1]
-            json_content += make_testcase(name) + ',\n'
-    json_content = json_content[0:-2]
-    json_content += '\n]'
+    names = collect_test_names(project_folder, static)
+    if names is None:
+        print('unittests2.json not written, fix the collection errors first')
+        return
+    testcases = [make_testcase(name) for name in names]
     autograding_folder = os.path.join(project_folder, '.github', 'autograding')
     os.makedirs(autograding_folder, exist_ok=True)
     file_path = os.path.join(autograding_folder, 'unittests2.json')
     with open(file_path, 'w') as file:
-        file.write(json_content)
+        json.dump(testcases, file, indent=2)
 
 
 def generate_lint_json(project_folder):
@@ -103,17 +122,11 @@ def list_python_files(folder_path):
 
 def make_testcase(name):
     """
-    Make the JSON for one testcase
+    Make the entry for one testcase
     :param name: Name of the test function
-    :return: JSON string for the testcase
+    :return: Dict for the testcase
     """
-    testcase = '  {\n'  \
-               f'    "name": "{name}",\n' \
-               f'    "function": "{name}",\n' \
-               f'    "timeout": 10,\n' \
-               f'    "points": 1\n' \
-               f'  }}'
-    return testcase
+    return {'name': name, 'function': name, 'timeout': 10, 'points': 1}
 
 
 if __name__ == '__main__':